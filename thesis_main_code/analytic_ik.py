@@ -0,0 +1,156 @@
+import time
+import numpy as np
+from de_algorithm import DifferentialEvolution
+from forward_kinematics import arc_frames
+from reachability import reachability_check, UnreachableTarget
+from solver_stats import SolverStats
+
+
+def arc_inverse(points: np.ndarray[float]):
+    """
+    Closed-form inverse of a constant-curvature arc: bending plane and curvature of the arc starting at the origin
+    tangent to z-axis and passing through the points. The arc ends at the point when its arc angle theta * seg_len
+    equals atan2(z, 1/theta - r), otherwise the point is not reachable with the segment length.
+
+    :param points: (..., 3) coordinates in the segment base frame [m].
+
+    :return: theta (...) segment bending angles [deg] (same convention as in piecewise_cc), phi (...) bending plane
+        rotation angles [rad] in [0, 2*pi).
+    """
+    points = np.asarray(points, dtype=float)
+    radial = np.hypot(points[..., 0], points[..., 1])
+    # circle through the origin with centre on the radial axis: (r - R)^2 + z^2 = R^2, curvature 1/R
+    theta = np.divide(2 * radial, radial ** 2 + points[..., 2] ** 2,
+                      out=np.zeros_like(radial), where=radial > 1e-12)
+    phi = np.mod(np.arctan2(points[..., 1], points[..., 0]), 2 * np.pi)
+    return theta, phi
+
+
+def segment_bases(theta: np.ndarray[float], phi: np.ndarray[float], seg_len: np.ndarray[float]) -> np.ndarray[float]:
+    """
+    End frames of chained segments for N configurations.
+
+    :param theta: (N, k) segment bending angles [deg].
+    :param phi: (N, k) bending plane rotation angles [rad].
+    :param seg_len: (k,) segment lengths [m].
+
+    :return: (N, 4, 4) transformation matrices of the end of the k-th segment.
+    """
+    base = np.tile(np.eye(4), (theta.shape[0], 1, 1))
+    for i in range(theta.shape[1]):
+        base = base @ arc_frames(theta[:, i], phi[:, i], seg_len[i])
+    return base
+
+
+class AnalyticInverseKinematics:
+    """
+    Inverse kinematics dispatcher using exact geometric solution of the last segment. Single-segment robots are solved
+    in closed form without search. For more segments the last segment is computed from the target expressed in its
+    base frame (end frame of the proximal segments), so the stochastic fallback searches only the 2*(num_seg - 1)
+    angles of the proximal segments.
+
+    fallback: PopulationAlgorithm searching the proximal segments, DifferentialEvolution by default. A solver without
+    search method (e.g. ParticleSwarmOptimization) solves the whole configuration instead.
+    """
+    name = 'analytic'
+
+    def __init__(self, seed=None, fallback=None):
+        self.fallback = DifferentialEvolution(seed=seed) if fallback is None else fallback
+        self.min_error = 0.0001  # in meters
+        self.stats = None  # SolverStats of the last optimize call
+
+    def optimize(self,
+                 num_seg: int,
+                 seg_len: np.ndarray[float],
+                 num_of_el: np.ndarray[int],
+                 di: float,
+                 angle_limits: np.ndarray[int],
+                 target_pos: np.ndarray[float],
+                 initial_guess: np.ndarray[float] = None,
+                 callback=None,
+                 time_budget: float = None) -> np.ndarray[float]:
+        """
+        Function search for possible solution of Inverse Kinematics.
+
+        :param num_seg: Number of segments
+        :param seg_len: Lengths of the segments  [m]
+        :param num_of_el: Number of elements per segment
+            if n=1 all segments with equal number of points
+        :param di: Arc end connection distance from origin of local coordinate system [m]
+        :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+        :param initial_guess: Configuration space angles (theta, phi) used as warm start of the fallback.
+        :param callback: Passed to the fallback, see ParticleSwarmOptimization.optimize (best position contains only
+            the proximal segment angles).
+        :param time_budget: Passed to the fallback, see ParticleSwarmOptimization.optimize.
+
+        :return: final_params: Configuration space angles, np.array([0.0]) if no solution was found, UnreachableTarget
+            for targets outside of the workspace. Telemetry of the call is stored in self.stats.
+        """
+        seg_len = np.asarray(seg_len, dtype=float)
+        target_pos = np.asarray(target_pos, dtype=float)
+        theta_max = float(np.max(angle_limits[0]))
+        phi_max = float(np.max(angle_limits[1]))
+
+        def last_segment(bases):
+            """
+            Closed-form angles of the last segment for (N, 4, 4) base frames and its end-point error.
+
+            :return: theta (N), phi (N) [deg] within the angle limits and error (N) [m]
+            """
+            local = np.einsum('nji,nj->ni', bases[:, :3, :3], target_pos - bases[:, :3, 3])  # R^T (target - p)
+            theta, phi = arc_inverse(local)
+            theta = np.minimum(theta, theta_max)
+            phi = np.minimum(np.rad2deg(phi), phi_max)
+            tip = bases @ arc_frames(theta, np.deg2rad(phi), seg_len[num_seg - 1])
+            return theta, phi, np.linalg.norm(target_pos - tip[:, :3, 3], axis=1)
+
+        if num_seg == 1:
+            self.stats = SolverStats(self.name)
+            unreachable = reachability_check(num_seg=num_seg, seg_len=seg_len, angle_limits=angle_limits,
+                                             target_pos=target_pos)
+            if unreachable is not None:
+                self.stats.finish(converged=False)
+                return unreachable
+            start = time.perf_counter()
+            theta, phi, error = last_segment(np.eye(4)[None])
+            self.stats.add_time('closed_form', start)
+            self.stats.evaluations = 1
+            self.stats.cost_history.append(float(error[0]))
+            if error[0] > self.min_error:  # the only candidate configuration misses the target
+                self.stats.finish(converged=False)
+                return UnreachableTarget('Target is not on the end-point surface of the segment.')
+            self.stats.finish(converged=True, residual=error[0])
+            return np.array([theta[0], phi[0]])
+
+        if not hasattr(self.fallback, 'search'):
+            result = self.fallback.optimize(num_seg, seg_len, num_of_el, di, angle_limits, target_pos,
+                                            initial_guess=initial_guess, callback=callback, time_budget=time_budget)
+            self.stats = self.fallback.stats
+            return result
+
+        self.stats = self.fallback.stats = SolverStats(f'{self.name}+{self.fallback.name}')
+        unreachable = reachability_check(num_seg=num_seg, seg_len=seg_len, angle_limits=angle_limits,
+                                         target_pos=target_pos)
+        if unreachable is not None:
+            self.stats.finish(converged=False)
+            return unreachable
+        proximal = num_seg - 1
+        lower = np.zeros(2 * proximal)
+        upper = np.concatenate((np.full(proximal, theta_max), np.full(proximal, phi_max)))
+
+        def objective_function(parameters):
+            """End-point error of proximal segment angles completed with the closed-form last segment."""
+            bases = segment_bases(parameters[:, :proximal], np.deg2rad(parameters[:, proximal:]), seg_len[:proximal])
+            return last_segment(bases)[2]
+
+        guess = None
+        if initial_guess is not None:
+            initial_guess = np.asarray(initial_guess, dtype=float).ravel()
+            guess = np.concatenate((initial_guess[:proximal], initial_guess[num_seg:num_seg + proximal]))
+        result = self.fallback.search(objective_function, lower, upper, guess, callback, time_budget, self.min_error)
+        if result.size == 1:
+            return result
+        theta, phi = result[None, :proximal], result[None, proximal:]
+        theta_last, phi_last, _ = last_segment(segment_bases(theta, np.deg2rad(phi), seg_len[:proximal]))
+        return np.concatenate((theta[0], theta_last, phi[0], phi_last))
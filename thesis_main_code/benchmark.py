@@ -0,0 +1,201 @@
+"""
+Benchmark suite of forward kinematics, actuator space mapping, inverse kinematics, workspace mapping and GUI
+startup.
+
+Usage: python benchmark.py [--output benchmark_results.json] [--repeat 5] [--quick]
+
+Results are stored as JSON (one record per benchmark case, with min and median time in seconds) together with
+interpreter, numpy and platform versions, so runs of different releases can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from forward_kinematics import piecewise_cc, actuator_space_mapping
+from ik_solver import SOLVERS, create_solver
+from inverse_kinematics import reachable_ep, workspace_accuracy
+
+SEED = 0
+SEG_LEN = np.array([0.025, 0.020, 0.030, 0.025])  # lengths of segments 1-4 [m]
+DI = 0.003
+ANGLE_LIMITS = np.array([[90], [360]])
+NUM_SEG = (1, 2, 3, 4)
+NUM_OF_EL = (10, 50, 100, 500)
+STARTUP = {'interpreter': 'pass',  # baseline, paid by every restart as well
+           'gui_import': 'import gui',  # before the window is shown
+           'gui_default_pose': 'import gui; gui.data_calculator(store=False)',
+           'gui_plot': 'import gui; gui.plot_setup(gui.data_calculator(store=False)); '
+                       'import matplotlib.backends.backend_tkagg'}  # until the figure can be embedded
+
+
+def measure(function, repeat: int) -> dict:
+    """
+    Calls function repeat times (after one warm-up call) and returns timing statistics.
+
+    :param function: Function without arguments.
+    :param repeat: Number of timed calls.
+
+    :return: dict with min and median time [s].
+    """
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min_s': float(np.min(times)), 'median_s': float(np.median(times)), 'repeat': repeat}
+
+
+def random_configuration(rng, num_seg: int):
+    """Random theta and phi [deg] within ANGLE_LIMITS."""
+    return (rng.uniform(0, ANGLE_LIMITS[0, 0], num_seg),
+            rng.uniform(0, ANGLE_LIMITS[1, 0], num_seg))
+
+
+def target_set(num_seg: int, num_reachable: int = 5):
+    """
+    Targets with known reachability: end points of random configurations (reachable) and a point further from the
+    base than the robot length (unreachable).
+
+    :return: list of (target, reachable) tuples.
+    """
+    rng = np.random.default_rng(SEED)
+    targets = []
+    for _ in range(num_reachable):
+        theta, phi = random_configuration(rng, num_seg)
+        targets.append((piecewise_cc(num_seg, theta, np.deg2rad(phi), SEG_LEN[:num_seg], DI, np.array([10]),
+                                     optimizer=True), True))
+    targets.append((np.array([0.0, 0.0, 2 * np.sum(SEG_LEN[:num_seg])]), False))
+    return targets
+
+
+def bench_forward_kinematics(repeat: int, num_of_el_values=NUM_OF_EL) -> list:
+    """piecewise_cc in full (backbone) and optimizer (end point) mode."""
+    records = []
+    rng = np.random.default_rng(SEED)
+    for num_seg in NUM_SEG:
+        theta, phi = random_configuration(rng, num_seg)
+        for num_of_el in num_of_el_values:
+            for optimizer in (False, True):
+                timing = measure(lambda: piecewise_cc(num_seg, theta, np.deg2rad(phi), SEG_LEN[:num_seg], DI,
+                                                      np.array([num_of_el]), optimizer=optimizer), repeat)
+                records.append({'name': 'piecewise_cc', 'num_seg': num_seg, 'num_of_el': num_of_el,
+                                'optimizer': optimizer, **timing})
+    return records
+
+
+def bench_actuator_space_mapping(repeat: int, num_of_el_values=NUM_OF_EL) -> list:
+    """actuator_space_mapping forward and inverse, 3 and 4 tendons, fully and partially constrained tendon path."""
+    records = []
+    rng = np.random.default_rng(SEED)
+    for num_seg in NUM_SEG:
+        theta, phi = random_configuration(rng, num_seg)
+        for num_of_el in num_of_el_values:
+            num_of_el_array = np.full(num_seg, num_of_el)
+            for num_tendons in (3, 4):
+                for partial_path in (False, True):
+                    lengths = actuator_space_mapping(num_tendons, num_of_el_array, SEG_LEN[:num_seg], DI, "i",
+                                                     partial_path, theta=theta, phi=phi)
+                    cases = {'i': dict(theta=theta, phi=phi), 'f': dict(lengths=lengths)}
+                    for kinematics, kwargs in cases.items():
+                        timing = measure(lambda: actuator_space_mapping(num_tendons, num_of_el_array,
+                                                                        SEG_LEN[:num_seg], DI, kinematics,
+                                                                        partial_path, **kwargs), repeat)
+                        records.append({'name': 'actuator_space_mapping', 'num_seg': num_seg,
+                                        'num_of_el': num_of_el, 'num_tendons': num_tendons,
+                                        'kinematics': kinematics, 'partial_path': partial_path, **timing})
+    return records
+
+
+def bench_inverse_kinematics(repeat: int) -> list:
+    """
+    Global inverse kinematics backends (ik_solver.SOLVERS) on reachable and unreachable targets, with success rate
+    and median number of forward kinematics evaluations, used to choose ik_solver.DEFAULT_SOLVER.
+    """
+    records = []
+    for name in SOLVERS:
+        if name == 'dls':  # local solver, needs an initial guess
+            continue
+        for num_seg in NUM_SEG:
+            for index, (target, reachable) in enumerate(target_set(num_seg)):
+                results = []
+                evaluations = []
+
+                def solve():
+                    solver = create_solver(name, seed=SEED + len(results))
+                    results.append(solver.optimize(num_seg, SEG_LEN[:num_seg], np.array([10]), DI, ANGLE_LIMITS,
+                                                   target))
+                    evaluations.append(solver.stats.evaluations)
+                timing = measure(solve, repeat)
+                records.append({'name': f'{name}_optimize', 'num_seg': num_seg, 'target': index,
+                                'reachable': reachable,
+                                'success_rate': float(np.mean([result.size > 1 for result in results])),
+                                'evaluations': float(np.median(evaluations)), **timing})
+    return records
+
+
+def bench_reachable_workspace(quick: bool = False) -> list:
+    """
+    Reachable workspace maps (one timed build per robot, the build is too long to repeat) with their accuracy against
+    dense random sampling: occupied part of the bounding sphere, false positive and false negative rates.
+    """
+    records = []
+    for num_seg in NUM_SEG[:2] if quick else NUM_SEG[:3]:
+        for theta_max in (20, 90):
+            angle_limits = np.array([[theta_max], [360]])
+            start = time.perf_counter()
+            workspace = reachable_ep(num_seg, SEG_LEN[:num_seg], np.array([10]), DI, angle_limits, seed=SEED)
+            elapsed = time.perf_counter() - start
+            accuracy = workspace_accuracy(workspace, num_seg, SEG_LEN[:num_seg], np.array([10]), DI, angle_limits,
+                                          seed=SEED + 1)
+            records.append({'name': 'reachable_ep', 'num_seg': num_seg, 'theta_max': theta_max,
+                            **{key: float(value) for key, value in accuracy.items()},
+                            'min_s': elapsed, 'median_s': elapsed, 'repeat': 1})
+    return records
+
+
+def bench_gui_startup(repeat: int) -> list:
+    """
+    GUI startup stages (STARTUP) measured in fresh interpreters, as paid at launch and by the restart button. The
+    window itself needs a display, so the stages before and after it is shown are timed.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    records = []
+    for name, code in STARTUP.items():
+        timing = measure(lambda: subprocess.run([sys.executable, '-c', code], cwd=directory, check=True), repeat)
+        records.append({'name': f'startup_{name}', **timing})
+    return records
+
+
+def run(repeat: int = 5, quick: bool = False) -> dict:
+    """Runs all benchmarks, quick mode uses only the smallest and the largest element count."""
+    num_of_el_values = (NUM_OF_EL[0], NUM_OF_EL[-1]) if quick else NUM_OF_EL
+    records = bench_forward_kinematics(repeat, num_of_el_values) + \
+        bench_actuator_space_mapping(repeat, num_of_el_values) + \
+        bench_inverse_kinematics(repeat) + \
+        bench_reachable_workspace(quick) + \
+        bench_gui_startup(repeat)
+    return {'environment': {'python': sys.version.split()[0], 'numpy': np.__version__,
+                            'platform': platform.platform(), 'processor': platform.processor(),
+                            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'seed': SEED,
+            'results': records}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Continuum robot toolbox benchmarks.')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON output file.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed calls per case.')
+    parser.add_argument('--quick', action='store_true', help='Only smallest and largest number of elements.')
+    args = parser.parse_args()
+
+    report = run(repeat=args.repeat, quick=args.quick)
+    with open(args.output, mode="w") as data_file:
+        json.dump(report, data_file, indent=4)
+    for record in report['results']:
+        case = ', '.join(f'{key}={value}' for key, value in record.items() if not key.endswith('_s'))
+        print(f"{record['median_s'] * 1000:10.3f} ms  {case}")
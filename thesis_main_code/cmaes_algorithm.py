@@ -0,0 +1,67 @@
+import numpy as np
+from population_algorithm import PopulationAlgorithm
+
+
+class CovarianceMatrixAdaptation(PopulationAlgorithm):
+    """
+    Inverse kinematics solver using (mu/mu_w, lambda) CMA-ES on configuration space angles normalized to [0, 1].
+    Candidates outside the bounds are repaired (clipped) before evaluation and update. Every generation is evaluated
+    in one batched forward kinematics call.
+    """
+    name = 'cmaes'
+
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.max_iter = 150  # CMA-ES needs more generations to adapt the covariance matrix than PSO or DE
+        self.pop_size = 12  # lambda, number of candidates per generation
+        self.sigma_init = 0.2  # initial step size (fraction of the angle range)
+        self.sigma_guess = 0.05  # initial step size of a warm start
+
+    def initialization(self, objective, dimension: int, guess: np.ndarray[float] = None):
+        n, lam = dimension, self.pop_size
+        mu = lam // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        self.weights = weights / np.sum(weights)
+        self.mu_eff = 1 / np.sum(self.weights ** 2)
+        # Strategy parameters, default values of Hansen, The CMA Evolution Strategy: A Tutorial
+        self.cc = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.cs = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.cmu = min(1 - self.c1, 2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        self.mean = self.rng.random(n) if guess is None else np.clip(guess, 0, 1)
+        self.sigma = self.sigma_init if guess is None else self.sigma_guess
+        self.C = np.eye(n)
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        cost = objective(self.mean[None, :])[0]
+        return self.mean, cost
+
+    def iteration(self, objective, iteration: int):
+        n = len(self.mean)
+        eigenvalues, B = np.linalg.eigh(self.C)
+        D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+        z = self.rng.standard_normal((self.pop_size, n))
+        y = (z * D) @ B.T  # samples of N(0, C)
+        X = np.clip(self.mean + self.sigma * y, 0, 1)  # repair of candidates outside the bounds
+        cost = objective(X)
+        order = np.argsort(cost)
+        y = (X[order[:len(self.weights)]] - self.mean) / self.sigma  # repaired steps of the selected candidates
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+
+        # Step size and covariance matrix adaptation
+        C_inv_sqrt = B @ np.diag(1 / D) @ B.T
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * (C_inv_sqrt @ y_w)
+        h_sig = np.linalg.norm(self.ps) / np.sqrt(1 - (1 - self.cs) ** (2 * (iteration + 1))) < \
+            (1.4 + 2 / (n + 1)) * self.chi_n
+        self.pc = (1 - self.cc) * self.pc + h_sig * np.sqrt(self.cc * (2 - self.cc) * self.mu_eff) * y_w
+        rank_mu = (y.T * self.weights) @ y
+        self.C = (1 - self.c1 - self.cmu) * self.C + \
+            self.c1 * (np.outer(self.pc, self.pc) + (1 - h_sig) * self.cc * (2 - self.cc) * self.C) + \
+            self.cmu * rank_mu
+        self.C = (self.C + self.C.T) / 2
+        self.sigma = min(self.sigma * np.exp((self.cs / self.damps) * (np.linalg.norm(self.ps) / self.chi_n - 1)), 1.0)
+        return X[order[0]], cost[order[0]]
@@ -3,9 +3,42 @@ import matplotlib.figure
 from mpl_toolkits.mplot3d.art3d import Line3DCollection  # Collection of 3D polygons
 
 
+def quiver_segments(starts: np.ndarray[float], directions: np.ndarray[float], length: float = 0.01,
+                    arrow_length_ratio: float = 0.3) -> np.ndarray[float]:
+    """
+    Line segments of 3D arrows, same geometry as Axes3D.quiver (pivot='tail'), so an existing quiver collection can
+    be updated with set_segments instead of being recreated.
+
+    :param starts: (n, 3) tails of the arrows.
+    :param directions: (n, 3) arrow vectors (u, v, w).
+    :param length: Length scaling of the arrows.
+    :param arrow_length_ratio: Ratio of the arrow head with respect to the arrow.
+
+    :return: (3n, 2, 3) segments, n shafts followed by n first and n second head lines.
+    """
+    directions = np.asarray(directions, dtype=float)
+    tips = starts + length * directions
+    # arrow head directions, the arrow rotated by +-15 degrees about horizontal axis perpendicular to it
+    norm = np.linalg.norm(directions[:, :2], axis=1)
+    x_p = np.divide(directions[:, 1], norm, where=norm != 0, out=np.zeros_like(norm))
+    y_p = np.divide(-directions[:, 0], norm, where=norm != 0, out=np.ones_like(norm))
+    c, s = np.cos(np.radians(15)), np.sin(np.radians(15))
+    rotation = np.array([[c + x_p ** 2 * (1 - c), x_p * y_p * (1 - c), y_p * s],
+                         [x_p * y_p * (1 - c), c + y_p ** 2 * (1 - c), -x_p * s],
+                         [-y_p * s, x_p * s, np.full_like(x_p, c)]])
+    opposite = rotation.copy()
+    opposite[[0, 1, 2, 2], [2, 2, 0, 1]] *= -1  # opposite rotation negates all the sin terms
+    heads = [tips - arrow_length_ratio * length * np.einsum('ij...,...j->...i', r, directions)
+             for r in (rotation, opposite)]
+    return np.concatenate((np.stack((tips, starts), axis=1),
+                           np.stack((tips, heads[0]), axis=1),
+                           np.stack((tips, heads[1]), axis=1)))
+
+
 class PlotSetup:
     """
-    Sets up the matplotlib figure.
+    Sets up the matplotlib figure. Artists (backbone lines, coordinate system arrows, legend) are created once and
+    updated in place for every frame of the animation; the interpolation of all frames is computed at frame 0.
 
     g: (start_position) n 4x4 backbone curve position transformation matrices reshaped
     into 1x16 vector (column-wise).
@@ -13,104 +46,150 @@ class PlotSetup:
      into 1x16 vector (column-wise).
     end_index: Indices of where tdcr segments ends.
     """
+    colors = ['FireBrick', 'DarkGreen', 'DarkBlue']
+    axes = ['x', 'y', 'z']
+
     def __init__(self, g: np.ndarray[float], new_g: np.ndarray[float], end_index: np.ndarray[int]):
         self.g = g
         self.new_g = new_g
         self.end_index = end_index
-        self.g_rot = [[self.g[value-1, 0:3], self.g[value-1, 4:7], self.g[value-1, 8:11]] for value in self.end_index]
-        # list of 3 arrays for X, Y, Z rotation
-        self.new_g_rot = None
+        self.num_frames = 30
+        self.positions = None  # (num_frames, n, 3) backbone points of all frames
+        self.rotations = None  # (num_frames, num_seg, 3, 3) x, y, z axes of segment end frames of all frames
         self.actual_g = self.g[:, 12:15]
-        self.actual_rot = self.g_rot
+        self.actual_rot = None
 
         self.fig = matplotlib.figure.Figure(figsize=(5, 5), label='TDCR')
         self.ax = self.fig.add_subplot(projection='3d')
+        self.lines = []  # backbone line of every segment
+        self.arrows = []  # arrow collection of every axis (x, y, z) of all coordinate systems
+        self.layout = None  # end_index the artists were created for
+        self.background = None  # saved figure without animated artists, used for blitting
+
+    @staticmethod
+    def end_rotations(g: np.ndarray[float], end_index: np.ndarray[int]) -> np.ndarray[float]:
+        """(num_seg, 3, 3) x, y, z axis vectors of the segment end frames (columns of the rotation matrices)."""
+        rows = g[np.asarray(end_index) - 1]
+        return np.stack((rows[:, 0:3], rows[:, 4:7], rows[:, 8:11]), axis=1)
 
     def __call__(self, i):
-        num_frames = 30
-        self.ax.clear()
         if i == 0:
-            self.new_g_rot = [[self.new_g[value-1, 0:3], self.new_g[value-1, 4:7], self.new_g[value-1, 8:11]] for value in self.end_index]
-            if len(self.g) != len(self.new_g):
-                self.g = self.new_g
-                self.actual_g = self.new_g
-                self.g_rot = self.new_g_rot
-                self.actual_rot = self.new_g_rot
-            self.axes_setup()
-            self.plot_backbone()
-            self.coordinate_systems()
-        else:
-            self.actual_g = np.array(self.g[:, 12:15] + ((self.new_g[:, 12:15] - self.g[:, 12:15]) / (num_frames-1) * i))
-            segment_list, rotation_list = [], []
-            for segment in range(len(self.new_g_rot)):
-                for arr in range(3):
-                    rotation_list.append(np.array(self.g_rot[segment][arr][:] + ((self.new_g_rot[segment][arr][:] - self.g_rot[segment][arr][:]) / (num_frames-1) * i)))
-                segment_list.append(rotation_list)
-                rotation_list = []
-            self.actual_rot = segment_list
-            self.axes_setup()
-            self.plot_backbone()
-            self.coordinate_systems()
+            self.prepare()
+        self.actual_g = self.positions[i]
+        self.actual_rot = self.rotations[i]
+        self.update_artists()
+
+    def prepare(self):
+        """Interpolates all frames between g and new_g, creates artists if the robot layout changed, sets limits."""
+        if len(self.g) != len(self.new_g):
+            self.g = self.new_g
+        start, end = self.g[:, 12:15], self.new_g[:, 12:15]
+        start_rot, end_rot = self.end_rotations(self.g, self.end_index), self.end_rotations(self.new_g, self.end_index)
+        t = np.arange(self.num_frames) / (self.num_frames - 1)
+        self.positions = start + (end - start) * t[:, None, None]
+        self.rotations = start_rot + (end_rot - start_rot) * t[:, None, None, None]
+        if self.layout is None or not np.array_equal(self.layout, self.end_index):
+            self.create_artists()
+        self.axes_setup()
+        self.background = None
+
+    def create_artists(self):
+        """Creates backbone lines, coordinate system arrows and legend."""
+        self.ax.clear()
+        self.lines = []
+        for i in range(len(self.end_index)):
+            rgb_val = (1 / len(self.end_index)) * i
+            line, = self.ax.plot([], [], [], color=(rgb_val, rgb_val, rgb_val), label=f'segment {i + 1}', lw=2)
+            self.lines.append(line)
+        self.arrows = []
+        fake_line = [(0, 0, 0), (0, 0, 0)]  # placeholder until the first frame, collection can't be added empty
+        for j in range(3):
+            arrows = Line3DCollection([fake_line], colors=self.colors[j], label=self.axes[j])
+            self.ax.add_collection3d(arrows)
+            self.arrows.append(arrows)
+        self.ax.set(xlabel='x [m]', ylabel='y [m]', zlabel='z [m]',
+                    title='Tendon Driven Continuum Robot\nPosition and Orientation')
         self.ax.legend()
+        self.layout = np.array(self.end_index)
 
-    def axes_setup(self):
-        # Setting axes, labels and title
-        backbone_z_length = np.sum(np.linalg.norm(self.actual_g[1:] - self.actual_g[:-1], axis=1))
-        #  computes the curve length along the second axis "axis = 1"
-        #  np.linalg.norm -> ord = "none" -> returns magnitude
-        #  g[1:, 12:15] - g[:-1,12:15] calculates the element-wise difference between 2 points end point - start point
+    @staticmethod
+    def axes_extent(positions: np.ndarray[float]) -> tuple[float, float, float]:
+        """
+        Axes limits (xmax, ymax, zmax) showing all frames.
+
+        :param positions: (frames, n, 3) backbone points.
+        """
+        backbone_z_length = np.max(np.sum(np.linalg.norm(np.diff(positions, axis=1), axis=2), axis=1))
+        #  computes the curve length of every frame, the longest one is used
         clearance = 0.02  # This parameter create a visual clearance between the surface and other elements
-        xmax = np.max(np.abs(self.actual_g[:, 0])) + clearance  # maximal value for X-axis
-        ymax = np.max(np.abs(self.actual_g[:, 1])) + clearance
+        xmax = np.max(np.abs(positions[..., 0])) + clearance  # maximal value for X-axis
+        ymax = np.max(np.abs(positions[..., 1])) + clearance
         zmax = backbone_z_length + clearance
-        self.ax.set(xlim=(-xmax, xmax), ylim=(-ymax, ymax), zlim=(0, zmax),
-                    xlabel='x [m]', ylabel='y [m]', zlabel='z [m]',
-                    aspect='equal',
-                    title='Tendon Driven Continuum Robot\nPosition and Orientation')
+        return float(xmax), float(ymax), float(zmax)
+
+    def axes_setup(self, extent: tuple[float, float, float] = None):
+        # Axes limits covering all frames of the animation, or the given extent (xmax, ymax, zmax)
+        xmax, ymax, zmax = self.axes_extent(self.positions) if extent is None else extent
+        self.ax.set(xlim=(-xmax, xmax), ylim=(-ymax, ymax), zlim=(0, zmax), aspect='equal')
+
+    def show(self, g: np.ndarray[float]):
+        """
+        Moves the robot to the pose g without animation (axes limits are not changed), used for trajectory rendering.
+
+        :param g: n 4x4 backbone curve transformation matrices reshaped into 1x16 vector (column-wise).
+        """
+        self.g = self.new_g = g
+        self.positions = g[None, :, 12:15]
+        self.rotations = self.end_rotations(g, self.end_index)[None]
+        if self.layout is None or not np.array_equal(self.layout, self.end_index):
+            self.create_artists()
+            self.background = None
+        self.actual_g = self.positions[0]
+        self.actual_rot = self.rotations[0]
+        self.update_artists()
 
-    def plot_backbone(self):
-        # Backbone of robot
+    def update_artists(self):
+        """Moves backbone lines and coordinate system arrows to the actual frame."""
         s = 0
-        for i in range(len(self.end_index)):
-            rgb_val = (1 / len(self.end_index)) * i
-            self.ax.plot(self.actual_g[s:self.end_index[i], 0],
-                         self.actual_g[s:self.end_index[i], 1],
-                         self.actual_g[s:self.end_index[i], 2],
-                         color=(rgb_val, rgb_val, rgb_val), label=f'segment {i + 1}', lw=2)
+        for i, line in enumerate(self.lines):
+            points = self.actual_g[s:self.end_index[i]]
+            line.set_data_3d(points[:, 0], points[:, 1], points[:, 2])
             s = self.end_index[i]
-    
-    def coordinate_systems(self):
-        # Coordinate systems
-        colors = ['FireBrick', 'DarkGreen', 'DarkBlue']
-        axes = ['x', 'y', 'z']
-        fake_line = [(0, 0, 0), (0, 0, 0)]
-        fake_line_list = [fake_line.copy() for _ in range(3)]
-
-        def coordinate_sys(start, end, arrow_index: [int]):
-            """
-            Nested function for coordinate system creation
-            start: 1x3 (x, y, z) start point coordinates
-            end: 1x3 (u, v, w)
-            arrow_index: (0-2) index based color picking
-            """
-            self.ax.quiver(start[0], start[1], start[2], end[0], end[1], end[2], color=colors[arrow_index], length=0.01)
-
-        # Segment frame coordinate systems
-        cycle_counter = 0
-        for value in self.end_index:
-            x, y, z = self.actual_g[value - 1, 0], self.actual_g[value - 1, 1], self.actual_g[value - 1, 2]
-            for i in range(3):
-                rot_x, rot_y, rot_z = self.actual_rot[cycle_counter][i][0], \
-                    self.actual_rot[cycle_counter][i][1], \
-                    self.actual_rot[cycle_counter][i][2]
-                coordinate_sys((x, y, z), (rot_x, rot_y, rot_z), i)
-                if cycle_counter == 0:  # this is for legend
-                    self.ax.add_collection3d(Line3DCollection(fake_line_list, colors=colors[i], label=axes[i]))
-            cycle_counter += 1
-
-        # Base frame coordinate system
-        s_point = np.zeros((3, 1))
-        end_point = np.eye(3)
-        for j in range(3):
-            coordinate_sys(s_point, end_point[j], j)
+        # Segment frame coordinate systems and base frame coordinate system
+        starts = np.vstack((self.actual_g[np.asarray(self.end_index) - 1], np.zeros((1, 3))))
+        for j, arrows in enumerate(self.arrows):
+            directions = np.vstack((self.actual_rot[:, j], np.eye(3)[j]))
+            arrows.set_segments(quiver_segments(starts, directions))
+
+    def artists(self) -> list:
+        """Artists changed by the animation."""
+        return self.lines + self.arrows
+
+    def blit(self, canvas):
+        """
+        Redraws only the animated artists over the saved background when the canvas supports blitting (the axes,
+        legend and panes are rendered once per animation), otherwise requests a full redraw.
+
+        :param canvas: Figure canvas (e.g. FigureCanvasTkAgg).
+        """
+        if not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+        if self.background is None:
+            for artist in self.artists():
+                artist.set_animated(True)
+            canvas.draw()
+            self.background = canvas.copy_from_bbox(self.fig.bbox)
+        canvas.restore_region(self.background)
+        for artist in self.artists():
+            if isinstance(artist, Line3DCollection):
+                artist.do_3d_projection()
+            self.ax.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
 
+    def finish_animation(self, canvas):
+        """Returns the artists to normal drawing, so the last frame stays visible when the view is rotated or zoomed."""
+        for artist in self.artists():
+            artist.set_animated(False)
+        self.background = None
+        canvas.draw_idle()
@@ -0,0 +1,45 @@
+import numpy as np
+from population_algorithm import PopulationAlgorithm
+
+
+class DifferentialEvolution(PopulationAlgorithm):
+    """
+    Inverse kinematics solver using DE/current-to-best/1/bin differential evolution on configuration space angles
+    normalized to [0, 1]. Mutation, crossover and selection are vectorized over the population, all trial vectors of
+    a generation are evaluated in one batched forward kinematics call.
+    """
+    name = 'de'
+
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.pop_size = 20
+        self.F = 0.6  # differential weight
+        self.CR = 0.9  # crossover probability
+        self.spread_guess = 0.05  # spread of the population around a warm start (fraction of the angle range)
+
+    def initialization(self, objective, dimension: int, guess: np.ndarray[float] = None):
+        self.population = self.rng.random((self.pop_size, dimension))
+        if guess is not None:  # half of the population around the guess, the other half stays uniform
+            half = self.pop_size // 2
+            self.population[:half] = np.clip(guess + self.rng.normal(0, self.spread_guess, (half, dimension)), 0, 1)
+            self.population[0] = np.clip(guess, 0, 1)
+        self.cost = objective(self.population)
+        best = np.argmin(self.cost)
+        return self.population[best], self.cost[best]
+
+    def iteration(self, objective, iteration: int):
+        size, dimension = self.population.shape
+        best = self.population[np.argmin(self.cost)]
+        # two distinct random members other than the current one for every member
+        partners = np.argsort(self.rng.random((size, size)) + 2 * np.eye(size), axis=1)[:, :2]
+        mutant = self.population + self.F * (best - self.population) + \
+            self.F * (self.population[partners[:, 0]] - self.population[partners[:, 1]])
+        cross = self.rng.random((size, dimension)) < self.CR
+        cross[np.arange(size), self.rng.integers(0, dimension, size)] = True  # at least one gene from the mutant
+        trial = np.clip(np.where(cross, mutant, self.population), 0, 1)
+        trial_cost = objective(trial)
+        improved = trial_cost <= self.cost
+        self.population[improved] = trial[improved]
+        self.cost[improved] = trial_cost[improved]
+        best = np.argmin(self.cost)
+        return self.population[best], self.cost[best]
@@ -0,0 +1,160 @@
+import time
+import numpy as np
+from forward_kinematics import piecewise_cc, tip_jacobian
+from reachability import reachability_check
+from solver_stats import SolverStats
+
+
+class DampedLeastSquares:
+    """
+    Class includes method optimize for damped least squares (Levenberg-Marquardt) inverse kinematics which returns
+    configuration space variables (theta, phi). Local gradient solver, converges in a few iterations when the initial
+    guess is close to the target (e.g. current pose of the robot).
+
+    Sources:
+    [1] https://www.math.ucsd.edu/~sbuss/ResearchWeb/ikmethods/iksurvey.pdf
+    [2] K. Madsen, H. B. Nielsen, O. Tingleff, Methods for Non-Linear Least Squares Problems, 2004.
+    """
+    def __init__(self):
+        self.current_pos = None
+        self.current_cost = None
+        self.damping = None
+        self.min_error = 0.0001  # in meters
+        self.stats = None  # SolverStats of the last optimize call
+
+    def optimize(self,
+                 num_seg: int,
+                 seg_len: np.ndarray[float],
+                 num_of_el: np.ndarray[int],
+                 di: float,
+                 angle_limits: np.ndarray[int],
+                 target_pos: np.ndarray[float],
+                 initial_guess: np.ndarray[float] = None,
+                 callback=None,
+                 time_budget: float = None) -> np.ndarray[float]:
+        """
+        Function search for possible solution of Inverse Kinematics.
+
+        :param num_seg: Number of segments
+        :param seg_len: Lengths of the segments  [m]
+        :param num_of_el: Number of elements per segment
+            if n=1 all segments with equal number of points
+        :param di: Arc end connection distance from origin of local coordinate system [m]
+        :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+        :param initial_guess: Starting configuration space angles (theta, phi) in degrees, e.g. current pose.
+        :param callback: Function callback(stats, current_pos) called after every iteration with SolverStats and actual
+            position, if it returns True the search is stopped.
+        :param time_budget: Anytime mode, time limit of the search [s]. When the limit is reached or the search gets
+            stuck, the best configuration found so far is returned instead of np.array([0.0]), self.stats.converged
+            tells if it is within min_error and self.stats.residual gives its error.
+
+        :return: final_params: Configuration space angles, np.array([0.0]) if no solution was found, UnreachableTarget
+            for targets outside of the workspace. Convergence telemetry of the call is stored in self.stats.
+        """
+        self.stats = SolverStats('dls')
+        unreachable = reachability_check(num_seg=num_seg, seg_len=seg_len, angle_limits=angle_limits,
+                                         target_pos=target_pos)
+        if unreachable is not None:  # reject targets outside of the workspace without searching
+            self.stats.finish(converged=False)
+            return unreachable
+        #                                            SETUP PARAMETERS                                            #
+        max_iter = 100
+        min_error = self.min_error
+        damping = {'initial': 1e-3, 'decrease': 3.0, 'increase': 4.0, 'max': 1e8}
+        bounds = {'theta_min': 0,
+                  'theta_max': float(np.max(angle_limits[0])),
+                  'phi_min': 0,
+                  'phi_max': float(np.max(angle_limits[1]))}  # boundary conditions for every section of CR
+
+        #                                             HELPER FUNCTIONS                                            #
+        def boundary_condition(parameters):
+            """
+            Function applies lower and upper bound limits. Negative theta is mirrored into the opposite bending
+            plane when the full phi circle is allowed.
+
+            :param parameters: [np.array] Configuration space angles (theta, phi)
+            """
+            parameters = parameters.copy()
+            if bounds['phi_max'] >= 360:
+                flipped = parameters[:num_seg] < bounds['theta_min']
+                parameters[:num_seg][flipped] *= -1
+                parameters[num_seg:][flipped] += 180
+                parameters[num_seg:] = np.mod(parameters[num_seg:], 360)
+            parameters[:num_seg] = np.clip(parameters[:num_seg], bounds['theta_min'], bounds['theta_max'])
+            parameters[num_seg:] = np.clip(parameters[num_seg:], bounds['phi_min'], bounds['phi_max'])
+            return parameters
+
+        def objective_function(parameters):
+            """
+            Calculates the error vector between the target and the end point of the configuration.
+
+            :param parameters: [np.array] Configuration space angles (theta, phi)
+
+            :return error: Error vector [Ex, Ey, Ez]
+            """
+            end_pos = piecewise_cc(num_seg=num_seg,
+                                   theta=parameters[:num_seg],  # the first half of  the list are theta's
+                                   phi=np.deg2rad(parameters[num_seg:]),  # the second half of the list are phi's
+                                   seg_len=seg_len,
+                                   di=di,
+                                   num_of_el=num_of_el,
+                                   optimizer=True)
+            self.stats.evaluations += 1
+            return target_pos - end_pos
+
+        def jacobian(parameters):
+            """
+            Jacobian of the end point with respect to (theta, phi), phi columns scaled to degrees.
+
+            :param parameters: [np.array] Configuration space angles (theta, phi)
+            """
+            jac = tip_jacobian(num_seg=num_seg,
+                               theta=parameters[:num_seg],
+                               phi=np.deg2rad(parameters[num_seg:]),
+                               seg_len=seg_len)
+            jac[:, num_seg:] *= np.pi / 180
+            return jac
+
+        def finish():
+            """Records the result into stats and returns it, in anytime mode failure returns best position so far."""
+            converged = self.current_cost <= min_error
+            self.stats.finish(converged=converged, residual=self.current_cost if converged or anytime else None)
+            return self.current_pos if converged or anytime else np.array([0.0])
+
+        #                                               MAIN LOOP                                                 #
+        anytime = time_budget is not None
+        deadline = None if time_budget is None else self.stats.start + time_budget
+        if initial_guess is None:
+            # straight robot is a singular configuration, start from a slightly bent pose
+            initial_guess = np.concatenate((np.full(num_seg, bounds['theta_max'] / 4),
+                                            np.full(num_seg, bounds['phi_max'] / 2)))
+        self.current_pos = boundary_condition(np.asarray(initial_guess, dtype=float).ravel())
+        error = objective_function(self.current_pos)
+        self.current_cost = np.linalg.norm(error)
+        self.damping = damping['initial']
+        for _ in range(max_iter):
+            if self.current_cost <= min_error or (deadline is not None and time.perf_counter() >= deadline):
+                break
+            jac = jacobian(self.current_pos)
+            hessian = jac.T @ jac
+            gradient = jac.T @ error
+            # Marquardt scaling of the damping term, floor keeps singular directions (theta = 0) regularized
+            scaling = np.maximum(np.diag(hessian), 1e-6 * np.max(np.diag(hessian)) + 1e-18)
+            step = np.linalg.solve(hessian + self.damping * np.diag(scaling), gradient)
+            candidate = boundary_condition(self.current_pos + step)
+            candidate_error = objective_function(candidate)
+            candidate_cost = np.linalg.norm(candidate_error)
+            if candidate_cost < self.current_cost:  # accept step, move towards Gauss-Newton
+                self.current_pos, error, self.current_cost = candidate, candidate_error, candidate_cost
+                self.damping = max(self.damping / damping['decrease'], 1e-12)
+            else:  # reject step, move towards gradient descent
+                self.damping *= damping['increase']
+                if self.damping > damping['max']:
+                    break
+            self.stats.iterations += 1
+            self.stats.cost_history.append(float(self.current_cost))
+            if callback is not None and callback(self.stats, self.current_pos):
+                self.stats.finish(converged=False)
+                return np.array([0.0])  # stopped by the caller
+        return finish()
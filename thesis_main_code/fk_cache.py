@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import numpy as np
+from forward_kinematics import piecewise_cc
+
+
+class FKCache:
+    """
+    Bounded memoization of forward kinematics results with least recently used eviction. Keys are the robot geometry
+    and configuration space angles quantized to resolution, so poses repeated by the GUI scales or by batch tools are
+    served from memory. Cached arrays are read-only.
+
+    max_size: Maximal number of cached results.
+    resolution: Quantization step of theta [deg] and phi [rad].
+    hits, misses, evictions: Counters of lookups served from the cache, computed results and dropped entries.
+    """
+    def __init__(self, max_size: int = 128, resolution: float = 1e-9):
+        if max_size < 1:
+            raise ValueError("Cache size has to be at least 1.")
+        self.max_size = max_size
+        self.resolution = resolution
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, values: np.ndarray[float]) -> np.ndarray[float]:
+        """Rounds angles to multiples of resolution."""
+        return np.round(np.asarray(values, dtype=float) / self.resolution) * self.resolution
+
+    def key(self, num_seg, theta, phi, seg_len, di, num_of_el, optimizer=False) -> tuple:
+        """Hashable key of robot geometry and quantized angles."""
+        return (int(num_seg), float(di), bool(optimizer),
+                tuple(np.asarray(seg_len, dtype=float).ravel()),
+                tuple(np.asarray(num_of_el, dtype=int).ravel()),
+                tuple(np.round(np.asarray(theta, dtype=float).ravel() / self.resolution).astype(np.int64)),
+                tuple(np.round(np.asarray(phi, dtype=float).ravel() / self.resolution).astype(np.int64)))
+
+    def get(self, key: tuple):
+        """Cached result of key (marked as most recently used), None if it is not cached."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value: np.ndarray[float]) -> np.ndarray[float]:
+        """Stores read-only copy of value under key, evicts least recently used entries above max_size."""
+        value = np.array(value)
+        value.flags.writeable = False
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def piecewise_cc(self,
+                     num_seg: int,
+                     theta: np.ndarray[float],
+                     phi: np.ndarray[float],
+                     seg_len: np.ndarray[float],
+                     di: float,
+                     num_of_el: np.ndarray[int],
+                     optimizer=False) -> np.ndarray[float]:
+        """
+        Cached forward_kinematics.piecewise_cc (same parameters and result), angles are quantized to resolution before
+        computing so a cached result equals a recomputed one.
+        """
+        key = self.key(num_seg, theta, phi, seg_len, di, num_of_el, optimizer)
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, piecewise_cc(num_seg=num_seg,
+                                               theta=self.quantize(theta),
+                                               phi=self.quantize(phi),
+                                               seg_len=np.asarray(seg_len, dtype=float),
+                                               di=di,
+                                               num_of_el=np.asarray(num_of_el),
+                                               optimizer=optimizer))
+        return value
+
+    def clear(self):
+        """Drops all entries and resets counters."""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> dict:
+        """Counters and size of the cache."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries),
+                'max_size': self.max_size, 'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -1,6 +1,7 @@
-import json
 import numpy as np
 
+DATA_FILE = "piecewise_cc_data.dat"  # Binary store of the last computed backbone curve g
+
 
 def piecewise_cc(num_seg: int,
                  theta: np.ndarray[float],
@@ -23,91 +24,355 @@ def piecewise_cc(num_seg: int,
     :return g : Backbone curve with m 4x4 transformation matrices, where m is total number of points, reshaped
     into 1x16 vector (column-wise).
     """
-
-    def tf_matrix_computation():
-        """
-        Function calculates the transformation matrix.
-
-        :return rot: Transformation matrix.
-        """
-        delta = np.linalg.norm(np.array([del_x, del_y]))
-        theta_q = delta / di
-
-        rot = np.array([
-            [1 + np.power((del_x / delta), 2) * (np.cos(theta_q) - 1),
-             (del_x * del_y) / np.power(delta, 2) * (np.cos(theta_q) - 1), (del_x / delta) * np.sin(theta_q), 0],
-            [(del_x * del_y) / np.power(delta, 2) * (np.cos(theta_q) - 1),
-             1 + np.power((del_y / delta), 2) * (np.cos(theta_q) - 1), (del_y / delta) * np.sin(theta_q), 0],
-            [-(del_x / delta) * np.sin(theta_q), -(del_y / delta) * np.sin(theta_q), np.cos(theta_q), 0],
-            [0, 0, 0, 0]
-        ])  # , dtype="object"
-        # Modifies the last column of rot to include translation of elements in matrix
-        t_temp = [del_x * (1 - np.cos(theta_q)), del_y * (1 - np.cos(theta_q)), delta * np.sin(theta_q)]
-        t_trans = [k * ((di * li) / np.power(delta, 2)) for k in t_temp]
-        t_trans.append(1)
-        rot[:, 3] = t_trans
-        return rot
-
     # Control if input arrays have same shape
     if theta.shape != phi.shape or theta.shape != seg_len.shape:
         raise ValueError("Dimension mismatch.")
 
+    theta = np.atleast_1d(theta)
+    phi = np.atleast_1d(phi)
+    seg_len = np.atleast_1d(seg_len)
+    num_of_el = np.atleast_1d(num_of_el)
     if num_of_el.size == 1 and num_seg > 1:  # If 1 parameter in vect->num_of_el and num_of_seg > 1
         num_of_el = np.tile(num_of_el, num_seg)  # Create an array that is num_of_el long with the num_seg repeated
 
-    g = np.zeros((np.sum(num_of_el), 16))  # Stores the transformation matrices of all the points
-    # in all the segments as rows
-    base = np.eye(4)
-    counter = 0  # Cycle counter
-    li = del_x = del_y = None
-
-    for i in range(num_seg):  # For each segment
-        li = seg_len[i]
-        del_x = theta[i] * seg_len[i] * di * np.cos(phi[i])
-        del_y = theta[i] * seg_len[i] * di * np.sin(phi[i])
-
-        if not optimizer:
-            for j in range(1, num_of_el[i] + 1):  # Iterates over the elements within the segment
-                li = seg_len[i]/num_of_el[i]*j
-                del_x = theta[i] * j * seg_len[i] / num_of_el[i] * di * np.cos(phi[i])
-                del_y = theta[i] * j * seg_len[i] / num_of_el[i] * di * np.sin(phi[i])
-                if j != 0 and theta[i] != 0:  # TF matrix for every element excluding base element
-                    tf_matrix = tf_matrix_computation()
-                else:  # base element and avoiding of division by 0 when theta[i] is zero
-                    tf_matrix = np.eye(4)
-                    tf_matrix[:, 3] = [0, 0, j * (seg_len[i] / num_of_el[i]), 1]
-                # Column-wise reshape
-                g[counter, :] = (base @ tf_matrix).T.reshape((1, 16))
-                # base @ rot: Performs a matrix multiplication
-                # .T attribute transposes the resulting matrix
-                # .reshape((1, 16)): Reshapes the transposed matrix into a 1x16 matrix
-                # Updates the transformation matrix for the current point in the g array
-                counter += 1
-            base = g[counter - 1, :].reshape(4, 4).T  # last-most point's transformation matrix is the new base
-        else:
-            if theta[i] != 0:
-                tf_matrix = tf_matrix_computation()
-            else:  # base element and avoiding of division by 0 when theta[i] is zero
-                tf_matrix = np.eye(4)
-                tf_matrix[:, 3] = [0, 0, seg_len[i], 1]
-            base @= tf_matrix
+    # Segment end frames, chained from the robot base: bases[i] is the base frame of segment i
+    seg_frames = arc_frames(theta[:num_seg], phi[:num_seg], seg_len[:num_seg])
+    bases = np.empty((num_seg + 1, 4, 4))
+    bases[0] = np.eye(4)
+    for i in range(num_seg):
+        bases[i + 1] = bases[i] @ seg_frames[i]
+
+    if optimizer:
+        return bases[-1, :3, -1]
+
+    # All element frames of all segments in one closed-form evaluation, element j of segment i lies at arc length
+    # j * seg_len[i] / num_of_el[i]
+    num_of_el = num_of_el[:num_seg]
+    seg_id = np.repeat(np.arange(num_seg), num_of_el)
+    el_id = np.arange(np.sum(num_of_el)) - np.repeat(np.cumsum(num_of_el) - num_of_el, num_of_el) + 1
+    el_frames = arc_frames(theta[seg_id], phi[seg_id], el_id * seg_len[seg_id] / num_of_el[seg_id])
+    # Column-wise reshape into rows of g: transposes every 4x4 matrix and flattens it into 1x16 vector
+    g = (bases[seg_id] @ el_frames).transpose(0, 2, 1).reshape(-1, 16)
+    return g
+
+
+def arc_frames(theta: np.ndarray[float],
+               phi: np.ndarray[float],
+               arc_len: np.ndarray[float]) -> np.ndarray[float]:
+    """
+    Function computes constant-curvature arc transformation matrices in closed form (broadcast over all inputs).
+
+    :param theta: Segment bending angle [deg], same convention as in piecewise_cc.
+    :param phi: Segment bending plane rotation angle [rad].
+    :param arc_len: Arc length from the segment base to the computed frame [m].
+
+    :return frames: (..., 4, 4) transformation matrices, leading shape is the broadcast shape of the inputs.
+    """
+    theta, phi, arc_len = np.broadcast_arrays(np.asarray(theta, dtype=float),
+                                              np.asarray(phi, dtype=float),
+                                              np.asarray(arc_len, dtype=float))
+    bent = theta != 0
+    angle = theta * arc_len
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+    cos_p, sin_p = np.cos(phi), np.sin(phi)
+    # radius of the arc, straight segments (theta == 0) are handled separately to avoid division by 0
+    radius = np.divide(1.0, theta, out=np.zeros_like(theta), where=bent)
+
+    frames = np.zeros(theta.shape + (4, 4))
+    frames[..., 0, 0] = 1 + cos_p ** 2 * (cos_a - 1)
+    frames[..., 0, 1] = frames[..., 1, 0] = cos_p * sin_p * (cos_a - 1)
+    frames[..., 1, 1] = 1 + sin_p ** 2 * (cos_a - 1)
+    frames[..., 0, 2] = cos_p * sin_a
+    frames[..., 1, 2] = sin_p * sin_a
+    frames[..., 2, 0] = -cos_p * sin_a
+    frames[..., 2, 1] = -sin_p * sin_a
+    frames[..., 2, 2] = cos_a
+    # 1 - cos(a) written as 2 * sin(a/2)^2 to keep precision for nearly straight segments
+    frames[..., 0, 3] = cos_p * 2 * np.sin(angle / 2) ** 2 * radius
+    frames[..., 1, 3] = sin_p * 2 * np.sin(angle / 2) ** 2 * radius
+    frames[..., 2, 3] = np.where(bent, sin_a * radius, arc_len)
+    frames[..., 3, 3] = 1
+    return frames
+
+
+def arc_frames_derivative(theta: np.ndarray[float],
+                          phi: np.ndarray[float],
+                          arc_len: np.ndarray[float]) -> tuple[np.ndarray[float], np.ndarray[float]]:
+    """
+    Function computes partial derivatives of arc_frames with respect to theta and phi (broadcast over all inputs).
+
+    :param theta: Segment bending angle [deg], same convention as in piecewise_cc.
+    :param phi: Segment bending plane rotation angle [rad].
+    :param arc_len: Arc length from the segment base to the computed frame [m].
+
+    :return d_theta, d_phi: (..., 4, 4) derivatives of the transformation matrices.
+    """
+    theta, phi, arc_len = np.broadcast_arrays(np.asarray(theta, dtype=float),
+                                              np.asarray(phi, dtype=float),
+                                              np.asarray(arc_len, dtype=float))
+    angle = theta * arc_len
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+    cos_p, sin_p = np.cos(phi), np.sin(phi)
+    # (1 - cos(a)) / theta, sin(a) / theta and their theta derivatives, series expansion close to straight segment
+    small = np.abs(angle) < 1e-4
+    safe = np.where(small, 1.0, theta)
+    vers = np.where(small, theta * arc_len ** 2 / 2, (1 - cos_a) / safe)
+    sinc = np.where(small, arc_len - theta ** 2 * arc_len ** 3 / 6, sin_a / safe)
+    d_vers = np.where(small, arc_len ** 2 * (0.5 - angle ** 2 / 8), (angle * sin_a - (1 - cos_a)) / safe ** 2)
+    d_sinc = np.where(small, -arc_len ** 2 * angle / 3, (angle * cos_a - sin_a) / safe ** 2)
+
+    d_theta = np.zeros(theta.shape + (4, 4))
+    d_theta[..., 0, 0] = -cos_p ** 2 * sin_a * arc_len
+    d_theta[..., 0, 1] = d_theta[..., 1, 0] = -cos_p * sin_p * sin_a * arc_len
+    d_theta[..., 1, 1] = -sin_p ** 2 * sin_a * arc_len
+    d_theta[..., 0, 2] = cos_p * cos_a * arc_len
+    d_theta[..., 1, 2] = sin_p * cos_a * arc_len
+    d_theta[..., 2, 0] = -cos_p * cos_a * arc_len
+    d_theta[..., 2, 1] = -sin_p * cos_a * arc_len
+    d_theta[..., 2, 2] = -sin_a * arc_len
+    d_theta[..., 0, 3] = cos_p * d_vers
+    d_theta[..., 1, 3] = sin_p * d_vers
+    d_theta[..., 2, 3] = d_sinc
+
+    d_phi = np.zeros(theta.shape + (4, 4))
+    d_phi[..., 0, 0] = -2 * cos_p * sin_p * (cos_a - 1)
+    d_phi[..., 0, 1] = d_phi[..., 1, 0] = (cos_p ** 2 - sin_p ** 2) * (cos_a - 1)
+    d_phi[..., 1, 1] = 2 * cos_p * sin_p * (cos_a - 1)
+    d_phi[..., 0, 2] = -sin_p * sin_a
+    d_phi[..., 1, 2] = cos_p * sin_a
+    d_phi[..., 2, 0] = sin_p * sin_a
+    d_phi[..., 2, 1] = -cos_p * sin_a
+    d_phi[..., 0, 3] = -sin_p * vers
+    d_phi[..., 1, 3] = cos_p * vers
+    return d_theta, d_phi
+
+
+def tip_jacobian(num_seg: int,
+                 theta: np.ndarray[float],
+                 phi: np.ndarray[float],
+                 seg_len: np.ndarray[float]) -> np.ndarray[float]:
+    """
+    Function computes analytic Jacobian of the end-point position returned by piecewise_cc(optimizer=True).
+
+    :param num_seg: Number of segments.
+    :param theta: Segment bending angle [deg].
+    :param phi: Segment bending plane rotation angle [rad].
+    :param seg_len: Segment lengths [m].
+
+    :return jacobian: 3 x (2*num_seg) matrix, first half of columns are d/d theta, second half d/d phi [1/rad].
+    """
+    theta = np.atleast_1d(np.asarray(theta, dtype=float))[:num_seg]
+    phi = np.atleast_1d(np.asarray(phi, dtype=float))[:num_seg]
+    seg_len = np.atleast_1d(np.asarray(seg_len, dtype=float))[:num_seg]
+
+    seg_frames = arc_frames(theta, phi, seg_len)
+    d_theta, d_phi = arc_frames_derivative(theta, phi, seg_len)
+    # bases[i] is the base frame of segment i, tails[i] is the end point expressed in the base frame of segment i + 1
+    bases = np.empty((num_seg, 4, 4))
+    bases[0] = np.eye(4)
+    for i in range(1, num_seg):
+        bases[i] = bases[i - 1] @ seg_frames[i - 1]
+    tails = np.empty((num_seg, 4))
+    tails[-1] = [0, 0, 0, 1]
+    for i in range(num_seg - 2, -1, -1):
+        tails[i] = seg_frames[i + 1] @ tails[i + 1]
+
+    jacobian = np.empty((3, 2 * num_seg))
+    jacobian[:, :num_seg] = (bases @ d_theta @ tails[..., None])[:, :3, 0].T
+    jacobian[:, num_seg:] = (bases @ d_phi @ tails[..., None])[:, :3, 0].T
+    return jacobian
+
+
+def piecewise_cc_batch(num_seg: int,
+                       theta: np.ndarray[float],
+                       phi: np.ndarray[float],
+                       seg_len: np.ndarray[float],
+                       di: float,
+                       num_of_el: np.ndarray[int],
+                       optimizer=False) -> np.ndarray[float]:
+    """
+    Batched version of piecewise_cc, evaluates N configurations at once.
+
+    :param num_seg: Number of segments.
+    :param theta: (N, num_seg) segment bending angles [deg].
+    :param phi: (N, num_seg) segment bending plane rotation angles [rad].
+    :param seg_len: Segment lengths [m].
+    :param di: Arc end connection distance from origin of local coordinate system [m].
+    :param num_of_el: Number of elements per segment if n=1 all segments with equal number of points.
+    :param optimizer: If True only end-point positions (Ex, Ey, Ez) are returned.
+
+    :return: (N, M, 4, 4) transformation matrices of all points, or (N, 3) end-point positions when optimizer is True.
+    (N, M, 4, 4) frames are converted to the piecewise_cc row format with frames.transpose(0, 1, 3, 2).reshape(N, M, 16)
+    """
+    theta = np.atleast_2d(np.asarray(theta, dtype=float))
+    phi = np.atleast_2d(np.asarray(phi, dtype=float))
+    seg_len = np.asarray(seg_len, dtype=float)
+    num_of_el = np.asarray(num_of_el, dtype=int)
 
+    # Control if input arrays have same shape
+    if theta.shape != phi.shape or theta.shape[1] != num_seg or seg_len.shape != (num_seg,):
+        raise ValueError("Dimension mismatch.")
+
+    if num_of_el.size == 1 and num_seg > 1:
+        num_of_el = np.tile(num_of_el, num_seg)
+
+    base = np.tile(np.eye(4), (theta.shape[0], 1, 1))
     if optimizer:
-        return base[:3, -1]
-    else:
-        return g
+        for i in range(num_seg):
+            base = base @ arc_frames(theta[:, i], phi[:, i], seg_len[i])
+        return base[:, :3, 3]
 
+    segments = []
+    for i in range(num_seg):
+        arc_len = seg_len[i] / num_of_el[i] * np.arange(1, num_of_el[i] + 1)
+        el_frames = base[:, None] @ arc_frames(theta[:, i, None], phi[:, i, None], arc_len)
+        segments.append(el_frames)
+        base = el_frames[:, -1]  # last-most point's transformation matrix is the new base
+    return np.concatenate(segments, axis=1)
+
+
+class IncrementalKinematics:
+    """
+    Forward kinematics with per-segment caching, for interactive editing and optimizers changing one segment at a
+    time. Element frames of every segment are kept relative to the segment base; changing a segment recomputes only
+    its own element frames, downstream segments are updated by left-multiplying their cached frames with the new base.
 
-def update_data(robot_parameters):
+    num_seg: Number of segments.
+    theta: Segment bending angles [deg].
+    phi: Segment bending plane rotation angles [rad].
+    seg_len: Segment lengths [m].
+    di: Arc end connection distance from origin of local coordinate system [m].
+    num_of_el: Number of elements per segment if n=1 all segments with equal number of points.
     """
-    Function creates piecewise_cc_data.json file with stored g (Transformation matrices).
+    def __init__(self,
+                 num_seg: int,
+                 theta: np.ndarray[float],
+                 phi: np.ndarray[float],
+                 seg_len: np.ndarray[float],
+                 di: float,
+                 num_of_el: np.ndarray[int]):
+        self.num_seg = num_seg
+        self.seg_len = np.asarray(seg_len, dtype=float)[:num_seg]
+        self.di = di
+        num_of_el = np.atleast_1d(np.asarray(num_of_el, dtype=int))
+        self.num_of_el = np.tile(num_of_el, num_seg) if num_of_el.size == 1 else num_of_el[:num_seg]
+        self.theta = np.array(theta, dtype=float)[:num_seg]
+        self.phi = np.array(phi, dtype=float)[:num_seg]
+        if self.theta.shape != (num_seg,) or self.phi.shape != (num_seg,) or self.seg_len.shape != (num_seg,):
+            raise ValueError("Dimension mismatch.")
+        self.end_index = np.cumsum(self.num_of_el)  # element rows of segment i are end_index[i-1]..end_index[i]
+        self.local = [self.segment_frames(i) for i in range(num_seg)]  # element frames relative to segment base
+        self.bases = np.tile(np.eye(4), (num_seg + 1, 1, 1))  # bases[i] is the base frame of segment i
+        self.frames = np.empty((int(self.end_index[-1]), 4, 4))  # element frames relative to the robot base
+        self.recompute_count = np.zeros(num_seg, dtype=int)  # number of element frame rebuilds per segment
+        self.propagate(0)
+
+    def segment_frames(self, segment: int) -> np.ndarray[float]:
+        """Element frames of the segment relative to its base."""
+        arc_len = self.seg_len[segment] / self.num_of_el[segment] * np.arange(1, self.num_of_el[segment] + 1)
+        return arc_frames(self.theta[segment], self.phi[segment], arc_len)
+
+    def propagate(self, segment: int):
+        """Updates bases and element frames of the segment and all downstream segments from the cached local ones."""
+        for i in range(segment, self.num_seg):
+            start = self.end_index[i] - self.num_of_el[i]
+            self.frames[start:self.end_index[i]] = self.bases[i] @ self.local[i]
+            self.bases[i + 1] = self.frames[self.end_index[i] - 1]
+
+    def set_segment(self, segment: int, theta: float = None, phi: float = None):
+        """
+        Changes angles of one segment, only its element frames are rebuilt.
+
+        :param segment: Segment index (from 0).
+        :param theta: New bending angle [deg], unchanged if None.
+        :param phi: New bending plane rotation angle [rad], unchanged if None.
+        """
+        if theta is not None:
+            self.theta[segment] = theta
+        if phi is not None:
+            self.phi[segment] = phi
+        self.local[segment] = self.segment_frames(segment)
+        self.recompute_count[segment] += 1
+        self.propagate(segment)
+
+    def set_configuration(self, theta: np.ndarray[float], phi: np.ndarray[float]):
+        """
+        Changes angles of all segments, element frames are rebuilt only for segments whose angles changed.
+
+        :param theta: Segment bending angles [deg].
+        :param phi: Segment bending plane rotation angles [rad].
+        """
+        theta = np.asarray(theta, dtype=float)[:self.num_seg]
+        phi = np.asarray(phi, dtype=float)[:self.num_seg]
+        changed = np.flatnonzero((theta != self.theta) | (phi != self.phi))
+        if changed.size == 0:
+            return
+        self.theta[changed] = theta[changed]
+        self.phi[changed] = phi[changed]
+        for i in changed:
+            self.local[i] = self.segment_frames(i)
+            self.recompute_count[i] += 1
+        self.propagate(changed[0])
+
+    def matches(self, num_seg: int, seg_len: np.ndarray[float], di: float, num_of_el: np.ndarray[int]) -> bool:
+        """Checks if the object was created for the given robot geometry."""
+        num_of_el = np.atleast_1d(np.asarray(num_of_el, dtype=int))
+        num_of_el = np.tile(num_of_el, num_seg) if num_of_el.size == 1 else num_of_el[:num_seg]
+        return (self.num_seg == num_seg and self.di == di and
+                np.array_equal(self.seg_len, np.asarray(seg_len, dtype=float)[:num_seg]) and
+                np.array_equal(self.num_of_el, num_of_el))
+
+    @property
+    def g(self) -> np.ndarray[float]:
+        """Backbone curve in piecewise_cc format, (m, 16) column-wise reshaped transformation matrices."""
+        return self.frames.transpose(0, 2, 1).reshape(-1, 16)
+
+    @property
+    def tip(self) -> np.ndarray[float]:
+        """End-point position (Ex, Ey, Ez)."""
+        return self.bases[-1, :3, 3].copy()
+
+
+def update_data(robot_parameters, num_of_el=None, path=DATA_FILE):
+    """
+    Function stores g (Transformation matrices) into binary file which readers can memory-map (see load_data).
+
+    File layout (little-endian): int64 header size h, int64 header [num_seg, m, num_of_el..., end_index...] of h
+    values, float64 m x 16 matrix g.
 
     :param robot_parameters: g, 1x16 transformation matrices.
+    :param num_of_el: Number of elements per segment, if n=1 all segments with equal number of points.
+    :param path: Data file path.
+
+    Raises ValueError if num_of_el does not sum to the number of matrices.
     """
-    data_for_json = robot_parameters.tolist()  # .json cannot store array data type
+    g = np.ascontiguousarray(robot_parameters, dtype='<f8').reshape(-1, 16)
+    num_of_el = np.atleast_1d(len(g) if num_of_el is None else np.asarray(num_of_el)).astype('<i8')
+    if num_of_el.size == 1 and num_of_el[0] != 0 and len(g) > num_of_el[0]:
+        num_of_el = np.tile(num_of_el, len(g) // num_of_el[0])
+    if np.sum(num_of_el) != len(g):
+        raise ValueError("Number of elements per segment does not match the number of transformation matrices.")
+    header = np.concatenate(([num_of_el.size, len(g)], num_of_el, np.cumsum(num_of_el))).astype('<i8')
 
-    with open("piecewise_cc_data.json", mode="w") as data_file:
-        json.dump(data_for_json, data_file, indent=4)
+    with open(path, mode="wb") as data_file:
+        np.array([header.size], dtype='<i8').tofile(data_file)
+        header.tofile(data_file)
+        g.tofile(data_file)
+
+
+def load_data(path=DATA_FILE):
+    """
+    Function maps g stored by update_data into memory (read-only, without copying).
+
+    :param path: Data file path.
+
+    :return: g, header: g as m x 16 np.memmap and dict with num_seg, num_of_el and end_index.
+    """
+    header_size = int(np.fromfile(path, dtype='<i8', count=1)[0])
+    header = np.fromfile(path, dtype='<i8', count=header_size, offset=8)
+    num_seg, num_points = int(header[0]), int(header[1])
+    g = np.memmap(path, dtype='<f8', mode='r', offset=8 * (1 + header_size), shape=(num_points, 16))
+    return g, dict(num_seg=num_seg, num_of_el=header[2:2 + num_seg], end_index=header[2 + num_seg:2 + 2 * num_seg])
 
 
 def actuator_space_mapping(num_tendons: int,
@@ -132,93 +397,105 @@ def actuator_space_mapping(num_tendons: int,
 
     :return: Parameters based on selected algorithm.
     """
-    result_list = []
-    iteration = 0
+    # Single configuration is a trajectory of length 1
+    trajectory = {key: np.asarray(value)[None] for key, value in kwargs.items()}
+    return actuator_space_mapping_batch(num_tendons=num_tendons,
+                                        num_of_el=num_of_el,
+                                        seg_len=seg_len,
+                                        di=di,
+                                        kinematics=kinematics,
+                                        partial_path=partial_path,
+                                        **trajectory)[0]
+
+
+def actuator_space_mapping_batch(num_tendons: int,
+                                 num_of_el: np.ndarray[int],
+                                 seg_len: np.ndarray[float],
+                                 di: float,
+                                 kinematics: str,
+                                 partial_path=False,
+                                 **kwargs):
+    """
+    Trajectory version of actuator_space_mapping, maps T configurations in one vectorized pass.
+
+    :param num_tendons: Number of tendons (3 or 4).
+    :param num_of_el: Number of elements per segment, if n=1 all segments with equal number of elements.
+    :param seg_len: Segment lengths.
+    :param di: Arc end connection distance from origin of local coordinate system [m].
+    :param kinematics: "f" (for forward) or "i" (for inverse).
+    :param partial_path: If true kinematics with partially constrained tendons is considered.
+    :param kwargs: When forward kinematics, lengths = (T, num_seg, num_tendons) tendon lengths changes, when inverse
+    kinematics theta and phi = (T, num_seg) angles [deg].
+
+    :return: (T, num_seg, 2) phi and theta [deg] when forward, (T, num_seg, num_tendons) tendon lengths changes when
+    inverse kinematics.
+    """
+    if num_tendons not in (3, 4):
+        raise ValueError("Number of tendons has to be 3 or 4.")
+    seg_len = np.asarray(seg_len, dtype=float)
+    num_of_el = np.asarray(num_of_el)
+    if num_of_el.size == 1:
+        num_of_el = np.tile(num_of_el, seg_len.size)
     #                                      Forward robot-specific kinematics                                      #
     if kinematics == "f":
         def angle_computation(len_of_tendons):
-            segment_length = seg_len[iteration]
-            ac1 = len_of_tendons[0]  # lengths on the first actuator for tendon_lengths-th segment
-            ac2 = len_of_tendons[1]
-            ac3 = len_of_tendons[2]
+            """Computes (T, num_seg) phi and theta [deg] from (T, num_seg, num_tendons) full tendon lengths."""
+            ac1 = len_of_tendons[..., 0]  # lengths on the first actuator
+            ac2 = len_of_tendons[..., 1]
+            ac3 = len_of_tendons[..., 2]
             if num_tendons == 3:
                 u_ = (ac2 - ac3) / (np.sqrt(3) * di)
-                v_ = (segment_length - ac1) / di
-            elif num_tendons == 4:
-                ac4 = len_of_tendons[3]
+                v_ = (seg_len - ac1) / di
+            else:
+                ac4 = len_of_tendons[..., 3]
                 u_ = (ac2 - ac4) / (2*di)
                 v_ = (ac3 - ac1) / (2*di)
-            else:
-                u_ = v_ = None
-            theta_ = np.rad2deg(np.linalg.norm([u_, v_]) / segment_length)
-            if theta_ != 0:  # to avoid division by 0
-                if v_ != 0:
-                    phi_ = np.rad2deg(np.arctan(-u_ / v_))
-                    # print(f"phi {phi}")
-                    if phi_ < 0:
-                        phi_ += 180
-                else:
-                    phi_ = 90
-            else:
-                phi_ = 0.0
-            if v_ < 0:
-                phi_ += 180
-            phi_ = round(phi_, 6)
-            theta_ = round(theta_, 6)
-            return phi_, theta_
-        # FORWARD KINEMATICS MAINLOOP
-        segments = kwargs["lengths"] + np.tile(seg_len, (num_tendons, 1)).T  # full tendon length
-        for tendon_lengths in segments:
-            temp = angle_computation(tendon_lengths)
-            phi = temp[0]
-            theta = temp[1]
-            result_list.append([phi, theta])
-
-            if partial_path and theta != 0:
-                # converts tendon considered as circular arc to it's partially constrained equivalent.
-                new_result_list = []
-                theta = np.deg2rad(theta)
-                for tendon in tendon_lengths:
-                    new_result = (tendon * theta) / (2 * num_of_el[iteration] * np.sin(
-                        theta / (2 * num_of_el[iteration])))
-                    new_result_list.append(new_result)
-                partial_angles = angle_computation(new_result_list)
-                result_list[iteration] = partial_angles
-            iteration += 1
-        return np.array(result_list)
+            theta_ = np.rad2deg(np.sqrt(u_ ** 2 + v_ ** 2) / seg_len)
+            phi_ = np.rad2deg(np.arctan(np.divide(-u_, v_, out=np.zeros_like(u_), where=v_ != 0)))
+            phi_ = np.where(phi_ < 0, phi_ + 180, phi_)
+            phi_ = np.where(v_ != 0, phi_, 90)
+            phi_ = np.where(theta_ != 0, phi_, 0.0)  # to avoid division by 0
+            phi_ = np.where(v_ < 0, phi_ + 180, phi_)
+            return np.round(phi_, 6), np.round(theta_, 6)
+
+        tendon_lengths = kwargs["lengths"] + seg_len[:, None]  # full tendon length
+        phi, theta = angle_computation(tendon_lengths)
+        if partial_path:
+            # converts tendon considered as circular arc to it's partially constrained equivalent.
+            bent = theta != 0
+            theta_rad = np.where(bent, np.deg2rad(theta), 1.0)[..., None]
+            new_lengths = (tendon_lengths * theta_rad) / (2 * num_of_el[:, None] * np.sin(
+                theta_rad / (2 * num_of_el[:, None])))
+            partial_phi, partial_theta = angle_computation(new_lengths)
+            phi = np.where(bent, partial_phi, phi)
+            theta = np.where(bent, partial_theta, theta)
+        return np.stack((phi, theta), axis=-1)
     #                                      Inverse robot-specific kinematics                                      #
     elif kinematics == "i":
-        for theta, phi, l in zip(kwargs["theta"], kwargs["phi"], seg_len):
-            theta = np.deg2rad(theta)
-            phi = np.deg2rad(phi)
-            h = l
-            if theta != 0:  # to avoid division by 0
-                v = np.sqrt((np.power((theta*h), 2) / (np.power(np.tan(phi), 2) + 1)))
-                u = - np.tan(phi) * v
-            else:
-                v = u = 0
-            if phi >= np.pi:  # opposite position for phi in range (180-360(0))
-                u *= -1
-                v *= -1
-            if num_tendons == 3:
-                ac_1 = h - di * v
-                ac_2 = h + (1 / 2) * di * (v + np.sqrt(3) * u)
-                ac_3 = h + (1 / 2) * di * (v - np.sqrt(3) * u)
-                result_list.append([ac_1, ac_2, ac_3])
-            elif num_tendons == 4:
-                ac_1 = h - di * v
-                ac_2 = h + di * u
-                ac_3 = h + di * v
-                ac_4 = h - di * u
-                result_list.append([ac_1, ac_2, ac_3, ac_4])
-            if partial_path and theta != 0:
-                # converts tendon considered as circular arc to it's partially constrained equivalent.
-                new_result_list = []
-                for tendon in result_list[iteration]:
-                    new_result = (tendon / theta) * 2 * num_of_el[iteration] * np.sin(
-                        theta / (2 * num_of_el[iteration]))
-                    new_result_list.append(new_result)
-                result_list[iteration] = new_result_list
-            iteration += 1
-        solution = np.array(result_list) - np.tile(seg_len, (num_tendons, 1)).T
+        theta = np.deg2rad(np.asarray(kwargs["theta"], dtype=float))
+        phi = np.deg2rad(np.asarray(kwargs["phi"], dtype=float))
+        h = seg_len
+        bent = theta != 0  # to avoid division by 0
+        v = np.where(bent, np.sqrt((np.power((theta*h), 2) / (np.power(np.tan(phi), 2) + 1))), 0.0)
+        u = np.where(bent, - np.tan(phi) * v, 0.0)
+        opposite = phi >= np.pi  # opposite position for phi in range (180-360(0))
+        u = np.where(opposite, -u, u)
+        v = np.where(opposite, -v, v)
+        if num_tendons == 3:
+            ac_1 = h - di * v
+            ac_2 = h + (1 / 2) * di * (v + np.sqrt(3) * u)
+            ac_3 = h + (1 / 2) * di * (v - np.sqrt(3) * u)
+            result = np.stack((ac_1, ac_2, ac_3), axis=-1)
+        else:
+            ac_1 = h - di * v
+            ac_2 = h + di * u
+            ac_3 = h + di * v
+            ac_4 = h - di * u
+            result = np.stack((ac_1, ac_2, ac_3, ac_4), axis=-1)
+        if partial_path:
+            # converts tendon considered as circular arc to it's partially constrained equivalent.
+            theta_rad = np.where(bent, theta, 1.0)[..., None]
+            partial = (result / theta_rad) * 2 * num_of_el[:, None] * np.sin(theta_rad / (2 * num_of_el[:, None]))
+            result = np.where(bent[..., None], partial, result)
+        solution = result - seg_len[:, None]
         return solution
@@ -1,17 +1,20 @@
 import os
 import sys
-import json
+import queue
+import threading
 import numpy as np
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from cr_plot import PlotSetup
-from forward_kinematics import piecewise_cc, update_data, actuator_space_mapping
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from pso_algorithm import ParticleSwarmOptimization
+from fk_cache import FKCache
+from forward_kinematics import IncrementalKinematics, update_data, actuator_space_mapping
+from ik_solver import create_solver
+from reachability import UnreachableTarget
+from solver_stats import enable_report_log
 #                                                   VARIABLES                                                    #
 FONT_NAME = 'Montserrat'
 BG_COLOR = '#C1C1C1'
+IK_SOLVER = None  # Inverse kinematics backend (key of ik_solver.SOLVERS), None selects ik_solver.DEFAULT_SOLVER
 data_dict = {  # Start values
              'seg_len': [0.025, 0.020, 0.030],
              'num_of_el': [10],
@@ -25,6 +28,9 @@ data_dict = {  # Start values
              'di': [0.003]
             }
 ani = ""
+plot = None  # PlotSetup of the robot figure, created by plot_setup after the window is shown
+fk_cache = FKCache(max_size=256)  # Poses repeated by scrubbing the scales are served from memory
+kinematics = None  # IncrementalKinematics of the plotted robot, rebuilds only segments whose angles changed
 
 
 #                                                   FUNCTIONS                                                  #
@@ -35,43 +41,69 @@ def restart_fcn():  # Restart button
     os.execl(python, python, *sys.argv)
 
 
-def data_calculator():
-    """Function calculates forward kinematics and returns TF matrices"""
-    g_matrices = piecewise_cc(num_seg=data_dict['num_seg'][0],
-                              theta=np.array(data_dict['theta']),
-                              phi=np.deg2rad(np.array(data_dict['phi'])),  # radians
-                              di=data_dict['di'][0],  # scientific format
-                              seg_len=np.array(data_dict['seg_len']),  # scientific format
-                              num_of_el=np.array(data_dict['num_of_el']))
-    update_data(robot_parameters=g_matrices)  # data update
+def data_calculator(store=True):
+    """
+    Function calculates forward kinematics, stores TF matrices into data file and returns them
+
+    :param store: Write the TF matrices into the data file (not needed for the default pose at launch).
+    """
+    global kinematics
+    num_seg = data_dict['num_seg'][0]
+    theta = fk_cache.quantize(data_dict['theta'])
+    phi = fk_cache.quantize(np.deg2rad(np.array(data_dict['phi'])))  # radians
+    seg_len = np.array(data_dict['seg_len'])  # scientific format
+    num_of_el = np.array(data_dict['num_of_el'])
+    key = fk_cache.key(num_seg, theta, phi, seg_len, data_dict['di'][0], num_of_el)
+    g_matrices = fk_cache.get(key)
+    if g_matrices is not None:
+        if store:
+            update_data(robot_parameters=g_matrices, num_of_el=num_of_el)  # data update
+        return g_matrices
+    if kinematics is None or not kinematics.matches(num_seg, seg_len, data_dict['di'][0], num_of_el):
+        kinematics = IncrementalKinematics(num_seg=num_seg, theta=theta, phi=phi, seg_len=seg_len,
+                                           di=data_dict['di'][0],  # scientific format
+                                           num_of_el=num_of_el)
+    else:
+        kinematics.set_configuration(theta=theta, phi=phi)
+    g_matrices = fk_cache.put(key, kinematics.g)
+    if store:
+        update_data(robot_parameters=g_matrices, num_of_el=num_of_el)  # data update
+    return g_matrices
+
+
+def plot_setup(g):
+    """
+    Function creates the robot figure with the start position g. Matplotlib and its 3D toolkit are imported here,
+    on the first use, so the window is shown without waiting for them.
+    """
+    global plot
+    from cr_plot import PlotSetup
+    plot = PlotSetup(g=g, new_g=np.array([]), end_index=np.array(data_dict['end_index']))
+    return plot
 
 
 def data_selector():
-    """Function calculates TF-matrices and store them into .json file"""
-    with open("./piecewise_cc_data.json", "r") as n:
-        old = json.load(n)
-    data_calculator()
-    with open("./piecewise_cc_data.json", "r") as p:
-        new = json.load(p)
+    """Function returns TF-matrices of the actual (last plotted) position and calculates the new ones"""
+    old = plot.new_g if plot.new_g.size else plot.g
+    new = data_calculator()
     return old, new
 
 
 # Animation
 def update_animate():
-    num_frames = 30
+    num_frames = plot.num_frames
 
     def update_fcn(frame):
         global ani
         if frame < num_frames:
             ani = root.window.after(100, update_fcn, frame + 1)
             plot(frame)
-            root.canvas.draw()
+            plot.blit(root.canvas)  # only the robot is redrawn, axes and legend are kept
         else:
             root.window.after_cancel(ani)
+            plot.finish_animation(root.canvas)
 
-    data_set = data_selector()
-    plot.g = np.array(data_set[0])
-    plot.new_g = np.array(data_set[1])
+    plot.g, plot.new_g = data_selector()
     plot.end_index = np.array(data_dict['end_index'])
     update_fcn(frame=0)
 
@@ -113,13 +145,18 @@ def help_b():
 
 
 class ContinuumRobotGUI:
-    def __init__(self, robot_plot):
-        self.robot_plot = robot_plot
+    def __init__(self):
+        self.robot_plot = None  # PlotSetup, set by canvas_setup
+        self.canvas = None
+        self.toolbar = None
         self.algorithm_selector = False  # Changing algorithm in function of the add button
         self.active_segment = 0  # Index of active segment
         self.table_data = []  # Table data manipulation
         self.ik_target = None
         self.kinematics = None
+        self.ik_request = 0  # Number of the latest IK solve, results of older solves are dropped as stale
+        self.ik_cancel = None  # threading.Event cancelling the running IK solve
+        self.ik_queue = queue.Queue()  # Progress and results from the IK worker thread
 
         # Window setup
         self.window = tk.Tk()
@@ -146,16 +183,6 @@ class ContinuumRobotGUI:
         d.create_text(320, 10, text='End-point position [mm]:', font=(FONT_NAME, 9, 'bold'))
         d.create_line(250, 20, 250, 130, fill=BG_COLOR, width=2)
 
-        # Canvas setup
-        self.canvas = FigureCanvasTkAgg(figure=robot_plot.fig, master=self.window)
-        self.canvas.draw()
-        self.canvas.get_tk_widget().grid(column=5, row=0, rowspan=11, padx=(20, 0), sticky='S')
-
-        # Toolbar
-        self.toolbar = NavigationToolbar2Tk(self.canvas, self.window, pack_toolbar=False)
-        self.toolbar.update()
-        self.toolbar.grid(column=5, row=11, sticky='NW', padx=(20, 0))
-
         # Label
         self.introduction = tk.Label(text='TDCR SETUP:', bg=BG_COLOR, font=(FONT_NAME, 18, 'bold'))
         self.introduction.grid(column=0, row=0, pady=5, sticky='N', columnspan=4)
@@ -225,6 +252,14 @@ class ContinuumRobotGUI:
         self.restart = tk.Button(text='Restart ⟲', command=restart_fcn, width=12, cursor='hand2',
                                  font=(FONT_NAME, 10))
         self.restart.grid(column=5, row=12, pady=5, sticky='SE')
+        # Cancel inverse kinematics button
+        self.cancel_b = tk.Button(text='Cancel IK ✖', command=self.cancel_b, width=12, cursor='hand2',
+                                  font=(FONT_NAME, 10), state='disabled')
+        self.cancel_b.grid(column=5, row=12, pady=5, sticky='SW', padx=(20, 0))
+
+        # Inverse kinematics progress
+        self.ik_progress = tk.Label(text='', bg=BG_COLOR, font=(FONT_NAME, 9))
+        self.ik_progress.grid(column=5, row=11, sticky='NE')
 
         # ENTRY
         self.entries = []
@@ -297,9 +332,25 @@ class ContinuumRobotGUI:
         self.window.protocol('WM_DELETE_WINDOW', self.on_closing)
 
 #                                                CLASS METHODS                                                #
+    # Canvas setup, after the window is shown
+    def canvas_setup(self, robot_plot):
+        """Embeds the robot figure and its toolbar into the window (imports the matplotlib Tk backend)"""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        self.robot_plot = robot_plot
+        self.canvas = FigureCanvasTkAgg(figure=robot_plot.fig, master=self.window)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().grid(column=5, row=0, rowspan=11, padx=(20, 0), sticky='S')
+
+        # Toolbar
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.window, pack_toolbar=False)
+        self.toolbar.update()
+        self.toolbar.grid(column=5, row=11, sticky='NW', padx=(20, 0))
+
     # Closing messagebox
     def on_closing(self):
         if messagebox.askokcancel('Quit', 'Do you want to quit?'):
+            if self.ik_cancel is not None:
+                self.ik_cancel.set()
             self.window.destroy()
 
     # Actuator space variables button
@@ -434,7 +485,6 @@ class ContinuumRobotGUI:
     def plot_b(self):
         """Prepare data for plot"""
         self.table_data = []
-        algorithm_stop = False
         self.plot_b.config(state='disabled', bg='#f0f0f0')
         children = self.table.get_children()
         for idn in children:
@@ -457,34 +507,12 @@ class ContinuumRobotGUI:
                 data_dict['phi'] += [int(_[3])]
                 data_dict['theta'] += [int(_[4])]
         if self.kinematics == 'i':
-            num_seg = data_dict['num_seg'][0]
-            pso_object = ParticleSwarmOptimization()
-            result = pso_object.optimize(num_seg=num_seg,
-                                         seg_len=np.array(data_dict['seg_len']),
-                                         num_of_el=np.array(data_dict['num_of_el']),
-                                         di=data_dict['di'][0],
-                                         angle_limits=np.array([data_dict['theta_limit'], data_dict['phi_limit']]),
-                                         target_pos=self.ik_target)
-            if result.size == 1:
-                messagebox.showwarning(title='Solution not found',
-                                       message="Inverse kinematic solver was not able to find a solution.\n"
-                                               "Please ensure that the entered values are correct and inside the "
-                                               "reachable workspace.")
-                self.plot_b.config(state='disabled')
-                algorithm_stop = True
-            else:
-                data_dict['theta'] = list(result[:num_seg])
-                data_dict['phi'] = list(result[num_seg:])
-                loop_var = 0
-                for res_t, res_p in zip(result[:num_seg], result[num_seg:]):
-                    self.table_data[loop_var][-1] = round(res_t, 2)
-                    self.table_data[loop_var][-2] = round(res_p, 2)
-                    children = self.table.get_children()
-                    self.table.delete(children[loop_var])
-                    self.table.insert(parent='', index=loop_var, values=self.table_data[loop_var])
-                    loop_var += 1
-                self.style.configure('Treeview.Heading', background='MediumSeaGreen')
+            self.start_ik()
+        else:
+            self.plot_finished(algorithm_stop=False)
 
+    def plot_finished(self, algorithm_stop):
+        """Plots the new position (if the kinematics was solved) and enables next steps"""
         self.new_entry_b.config(state='normal')
         if not algorithm_stop:
             update_animate()
@@ -497,11 +525,122 @@ class ContinuumRobotGUI:
                     coordinates.insert(tk.END, string=f"{end_tip_position[loop_var]}")
                     loop_var += 1
 
+    # Inverse kinematics in worker thread
+    def start_ik(self):
+        """Starts the IK solver in a worker thread, progress and result are passed back through ik_queue"""
+        self.ik_request += 1
+        request = self.ik_request
+        cancel = threading.Event()
+        self.ik_cancel = cancel
+        num_seg = data_dict['num_seg'][0]
+        solver = create_solver(IK_SOLVER)
+        robot = dict(num_seg=num_seg,
+                     seg_len=np.array(data_dict['seg_len']),
+                     num_of_el=np.array(data_dict['num_of_el']),
+                     di=data_dict['di'][0],
+                     angle_limits=np.array([data_dict['theta_limit'], data_dict['phi_limit']]),
+                     target_pos=self.ik_target)
+
+        def callback(stats, best_pos):
+            """Called by the solver after every iteration (worker thread), returns True to stop the solver"""
+            self.ik_queue.put(('progress', request, (stats.iterations, stats.restarts, stats.cost_history[-1])))
+            return cancel.is_set()
+
+        def run():
+            try:
+                result = solver.optimize(**robot, callback=callback)
+            except Exception as error:  # shown in the main thread
+                result = error
+            self.ik_queue.put(('result', request, result))
+
+        threading.Thread(target=run, daemon=True).start()
+        self.cancel_b.config(state='normal', bg='IndianRed')
+        self.new_entry_b.config(state='normal')  # entering a new target cancels this solve
+        self.ik_progress.config(text='Solving inverse kinematics...')
+        self.window.after(100, self.poll_ik)
+
+    def poll_ik(self):
+        """Main thread: shows progress of the running IK solve and handles its result, stale messages are dropped"""
+        finished = self.ik_cancel is None
+        while True:
+            try:
+                message, request, content = self.ik_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request != self.ik_request:
+                continue  # solve replaced by a newer one or abandoned
+            if message == 'progress':
+                iterations, restarts, cost = content
+                self.ik_progress.config(text=f'IK iteration {iterations}, restart {restarts}, '
+                                             f'error {cost * 1000:.3f} mm')
+            else:
+                self.ik_finished(content)
+                finished = True
+        if not finished:
+            self.window.after(100, self.poll_ik)
+
+    def ik_finished(self, result):
+        """Main thread: shows the result of the IK solve, fills the table and plots the new position"""
+        cancelled = self.ik_cancel.is_set()
+        self.ik_cancel = None
+        self.cancel_b.config(state='disabled', bg='#f0f0f0')
+        num_seg = data_dict['num_seg'][0]
+        algorithm_stop = True
+        if isinstance(result, Exception):
+            self.ik_progress.config(text='')
+            messagebox.showerror(title='Solver error', message=f"Inverse kinematic solver failed:\n{result}")
+            self.plot_b.config(state='disabled')
+        elif cancelled:
+            self.ik_progress.config(text='Inverse kinematics cancelled.')
+            self.plot_b.config(state='normal', bg='MediumSeaGreen')
+        elif isinstance(result, UnreachableTarget):
+            self.ik_progress.config(text='')
+            messagebox.showwarning(title='Target unreachable',
+                                   message=f"{result.reason}\n"
+                                           "Please ensure that the entered values are correct and inside the "
+                                           "reachable workspace.")
+            self.plot_b.config(state='disabled')
+        elif result.size == 1:
+            self.ik_progress.config(text='')
+            messagebox.showwarning(title='Solution not found',
+                                   message="Inverse kinematic solver was not able to find a solution.\n"
+                                           "Please ensure that the entered values are correct and inside the "
+                                           "reachable workspace.")
+            self.plot_b.config(state='disabled')
+        else:
+            self.ik_progress.config(text='')
+            data_dict['theta'] = list(result[:num_seg])
+            data_dict['phi'] = list(result[num_seg:])
+            loop_var = 0
+            for res_t, res_p in zip(result[:num_seg], result[num_seg:]):
+                self.table_data[loop_var][-1] = round(res_t, 2)
+                self.table_data[loop_var][-2] = round(res_p, 2)
+                children = self.table.get_children()
+                self.table.delete(children[loop_var])
+                self.table.insert(parent='', index=loop_var, values=self.table_data[loop_var])
+                loop_var += 1
+            self.style.configure('Treeview.Heading', background='MediumSeaGreen')
+            algorithm_stop = False
+        self.plot_finished(algorithm_stop)
+
+    # Cancel IK button pressed
+    def cancel_b(self):
+        """Stops the running IK solve, the solver returns at its next iteration"""
+        if self.ik_cancel is not None:
+            self.ik_cancel.set()
+            self.ik_progress.config(text='Cancelling...')
+
     # New entry button pressed
     def new_entry_b(self):
         """Replaces all data in segment bending angle column with 0."""
 
         self.algorithm_selector = True  # add button now only actualize configuration space variables
+        if self.ik_cancel is not None:  # new target while solving, running solve is cancelled and its result dropped
+            self.ik_cancel.set()
+            self.ik_cancel = None
+            self.ik_request += 1
+            self.cancel_b.config(state='disabled', bg='#f0f0f0')
+            self.ik_progress.config(text='')
         self.new_entry_b.config(state='disabled')
         for cor_entry in self.entries[5:]:
             cor_entry.delete(0, tk.END)
@@ -526,9 +665,8 @@ class ContinuumRobotGUI:
 
 if '__main__' == __name__:
 
-    plot = PlotSetup(g=np.array(data_selector()[1]),
-                     new_g=np.array([]),
-                     end_index=np.array(data_dict['end_index']))
-
-    root = ContinuumRobotGUI(robot_plot=plot)
+    enable_report_log()  # solver telemetry into report.log
+    root = ContinuumRobotGUI()
+    root.window.update()  # the window is shown before matplotlib is imported
+    root.canvas_setup(plot_setup(g=data_calculator(store=False)))  # default pose in memory, data file not written
     root.window.mainloop()
@@ -0,0 +1,123 @@
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from fk_cache import FKCache
+from forward_kinematics import actuator_space_mapping
+from ik_session import IKSession
+
+_END = object()  # Marks the end of the target stream in the queue
+
+
+class TendonPipeline:
+    """
+    Streaming pipeline from end-point targets to tendon length changes: inverse kinematics (warm-started IKSession),
+    actuator space mapping and optional forward kinematics verification.
+
+    num_seg: Number of segments.
+    seg_len: Lengths of the segments [m].
+    num_of_el: Number of elements per segment.
+    di: Arc end connection distance from origin of local coordinate system [m].
+    angle_limits: array with theta max and phi max (starting from zero) in degrees.
+    num_tendons: Number of tendons.
+    partial_path: If true kinematics with partially constrained tendons is considered.
+    verify: If true the end point of the solution is recomputed with piecewise_cc and its error is reported.
+    session: IKSession used for solving, created from the robot parameters by default.
+    executor: Executor running the blocking computations, single worker thread by default (keeps the order of targets
+    and warm start state of the session).
+    max_queue: Number of targets read ahead from the input stream (backpressure).
+    fk_cache: FKCache of the verification (repeated targets give repeated poses), created by default.
+    time_budget: Time limit of the inverse kinematics of one target [s] (bounded latency per target), see
+    IKSession.solve. None solves without limit.
+    """
+    def __init__(self,
+                 num_seg: int,
+                 seg_len: np.ndarray[float],
+                 num_of_el: np.ndarray[int],
+                 di: float,
+                 angle_limits: np.ndarray[int],
+                 num_tendons: int,
+                 partial_path=False,
+                 verify=False,
+                 session=None,
+                 executor=None,
+                 max_queue: int = 4,
+                 fk_cache=None,
+                 time_budget: float = None):
+        self.num_seg = num_seg
+        self.seg_len = seg_len
+        self.num_of_el = num_of_el
+        self.di = di
+        self.num_tendons = num_tendons
+        self.partial_path = partial_path
+        self.verify = verify
+        self.fk_cache = FKCache() if fk_cache is None else fk_cache
+        self.session = IKSession(num_seg, seg_len, num_of_el, di, angle_limits) if session is None else session
+        self.executor = ThreadPoolExecutor(max_workers=1) if executor is None else executor
+        self.max_queue = max_queue
+        self.time_budget = time_budget
+
+    def process(self, target_pos: np.ndarray[float]) -> dict:
+        """
+        Blocking computation for one target.
+
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+
+        :return: dict with target, status ('solved', 'unreachable', 'not found' or 'timeout'), angles (theta, phi)
+        [deg], tendon_lengths (num_seg x num_tendons) changes [m] and tip_error [m] when verify is set. On 'timeout'
+        the values belong to the closest configuration found within time_budget.
+        """
+        target_pos = np.asarray(target_pos, dtype=float)
+        angles = self.session.solve(target_pos, time_budget=self.time_budget)
+        result = dict(target=target_pos, status=self.session.status, angles=None, tendon_lengths=None, tip_error=None)
+        if angles.size == 1:
+            return result
+        theta, phi = angles[:self.num_seg], angles[self.num_seg:]
+        result['angles'] = angles
+        result['tendon_lengths'] = actuator_space_mapping(num_tendons=self.num_tendons,
+                                                          num_of_el=np.asarray(self.num_of_el),
+                                                          seg_len=np.asarray(self.seg_len),
+                                                          di=self.di,
+                                                          kinematics="i",
+                                                          partial_path=self.partial_path,
+                                                          theta=theta,
+                                                          phi=phi)
+        if self.verify:
+            tip = self.fk_cache.piecewise_cc(num_seg=self.num_seg,
+                                             theta=theta,
+                                             phi=np.deg2rad(phi),
+                                             seg_len=np.asarray(self.seg_len),
+                                             di=self.di,
+                                             num_of_el=np.asarray(self.num_of_el),
+                                             optimizer=True)
+            result['tip_error'] = float(np.linalg.norm(target_pos - tip))
+        return result
+
+    async def stream(self, targets):
+        """
+        Consumes an async iterator of targets and yields results of process in the same order. Computations run in
+        the executor, so the event loop stays responsive; at most max_queue targets are read ahead.
+
+        :param targets: Async iterator of target points (Ex, Ey, Ez).
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queue)
+
+        async def producer():
+            try:
+                async for target in targets:
+                    await queue.put(target)
+            except Exception as error:  # passed to the consumer, raised in the caller
+                await queue.put(error)
+            await queue.put(_END)
+
+        reader = asyncio.create_task(producer())
+        try:
+            while True:
+                target = await queue.get()
+                if target is _END:
+                    break
+                if isinstance(target, Exception):
+                    raise target
+                yield await loop.run_in_executor(self.executor, self.process, target)
+        finally:
+            reader.cancel()
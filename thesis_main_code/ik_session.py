@@ -0,0 +1,249 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dls_algorithm import DampedLeastSquares
+from ik_solver import create_solver
+from pso_algorithm import ParticleSwarmOptimization
+from reachability import reachability_check, UnreachableTarget
+from solver_stats import SolverStats, nested
+from workspace_index import WorkspaceIndex
+
+_worker_index = None  # WorkspaceIndex shared by the chunks solved in a solve_many worker process
+
+
+class IKSession:
+    """
+    Stateful inverse kinematics for streams of close targets (trajectory following). Every solve is warm-started from
+    the previous solution: the local refiner starts directly from it and, if the refiner fails, the global solver
+    concentrates part of its swarm around it. The workspace index (if given) is consulted only when there is no
+    previous solution (first target or after reset): its nearest configuration is polished by the refiner, a few
+    iterations from seeds tenths of a millimetre away, or returned directly when the refiner is disabled and it is
+    within min_error from the target.
+
+    num_seg: Number of segments.
+    seg_len: Lengths of the segments [m].
+    num_of_el: Number of elements per segment.
+    di: Arc end connection distance from origin of local coordinate system [m].
+    angle_limits: array with theta max and phi max (starting from zero) in degrees.
+    solver: Global solver with optimize(..., initial_guess=...) method, ParticleSwarmOptimization by default.
+    refiner: Local solver with optimize(..., initial_guess=...) method, DampedLeastSquares by default, False
+    disables it.
+    index: WorkspaceIndex of the robot, optional.
+    status: Outcome of the last solve: 'solved', 'unreachable', 'not found' or 'timeout'.
+    stats: SolverStats of the last solve, the refiner and solver records are nested in it.
+    """
+    def __init__(self,
+                 num_seg: int,
+                 seg_len: np.ndarray[float],
+                 num_of_el: np.ndarray[int],
+                 di: float,
+                 angle_limits: np.ndarray[int],
+                 solver=None,
+                 refiner=None,
+                 index=None):
+        self.num_seg = num_seg
+        self.seg_len = seg_len
+        self.num_of_el = num_of_el
+        self.di = di
+        self.angle_limits = angle_limits
+        self.solver = ParticleSwarmOptimization() if solver is None else solver
+        self.refiner = DampedLeastSquares() if refiner is None else refiner
+        self.index = index
+        self.min_error = 0.0001  # in meters
+        self.previous = None  # last found configuration space angles
+        self.status = None
+        self.stats = None
+
+    def solve(self, target_pos: np.ndarray[float], time_budget: float = None) -> np.ndarray[float]:
+        """
+        Function search for solution of Inverse Kinematics seeded by the previous solution.
+
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+        :param time_budget: Time limit of the solve [s], the remaining time is passed to the anytime mode of the
+            refiner and the solver. When it runs out, the closest configuration found so far is returned and
+            self.status is 'timeout'.
+
+        :return: Configuration space angles, np.array([0.0]) if no solution was found, UnreachableTarget for targets
+            outside of the workspace
+        """
+        self.stats = SolverStats('session')
+        deadline = None if time_budget is None else self.stats.start + time_budget
+        unreachable = reachability_check(num_seg=self.num_seg, seg_len=self.seg_len, angle_limits=self.angle_limits,
+                                         target_pos=target_pos, tolerance=self.min_error)
+        if unreachable is not None:
+            self.status = 'unreachable'
+            self.stats.finish(converged=False)
+            return unreachable
+        robot = dict(num_seg=self.num_seg, seg_len=self.seg_len, num_of_el=self.num_of_el, di=self.di,
+                     angle_limits=self.angle_limits, target_pos=target_pos)
+        closest, closest_error = np.array([0.0]), np.inf  # best approximation returned by anytime mode
+        residual = None
+
+        def run(solver, guess):
+            """Solves with the remaining time budget, approximations of anytime mode count as not found."""
+            nonlocal closest, closest_error, residual
+            start = time.perf_counter()
+            with nested(self.stats.id):
+                if deadline is None:
+                    found = solver.optimize(**robot, initial_guess=guess)
+                else:
+                    found = solver.optimize(**robot, initial_guess=guess,
+                                            time_budget=max(deadline - time.perf_counter(), 0.0))
+            self.stats.add_time(solver.stats.solver, start)
+            self.stats.iterations += solver.stats.iterations
+            self.stats.evaluations += solver.stats.evaluations
+            residual = solver.stats.residual
+            if deadline is not None and found.size > 1 and not solver.stats.converged:
+                error = np.inf if solver.stats.residual is None else solver.stats.residual
+                if error < closest_error:
+                    closest, closest_error = found, error
+                return np.array([0.0])
+            return found
+
+        result = np.array([0.0])
+        guess = self.previous
+        if guess is None and self.index is not None:
+            guess, distance = self.index.query(target_pos)
+            guess = np.array(guess)  # copy, the index configurations are shared
+            if distance <= self.min_error and not self.refiner:
+                result, residual = guess, distance
+        if result.size == 1 and guess is not None and self.refiner:
+            result = run(self.refiner, guess)
+        if result.size == 1 and (deadline is None or time.perf_counter() < deadline):
+            result = run(self.solver, guess)
+        if result.size > 1:
+            self.status = 'solved'
+            self.previous = np.array(result, dtype=float)
+            self.stats.finish(converged=True, residual=residual)
+        elif isinstance(result, UnreachableTarget):
+            self.status = 'unreachable'
+            self.stats.finish(converged=False)
+        elif closest.size > 1 and time.perf_counter() >= deadline:
+            self.status = 'timeout'
+            self.previous = np.array(closest, dtype=float)  # best available warm start of the next target
+            self.stats.finish(converged=False, residual=closest_error)
+            return closest
+        else:
+            self.status = 'not found'
+            self.stats.finish(converged=False)
+        return result
+
+    def reset(self, initial_guess: np.ndarray[float] = None):
+        """
+        Forgets the previous solution or replaces it with a known configuration (e.g. current robot pose).
+
+        :param initial_guess: Configuration space angles (theta, phi) in degrees.
+        """
+        self.previous = None if initial_guess is None else np.array(initial_guess, dtype=float)
+
+
+def _init_worker(index):
+    """Stores the workspace index in the worker process, so it is sent once per process and not per chunk."""
+    global _worker_index
+    _worker_index = index
+
+
+def _solve_chunk(robot: dict, targets: np.ndarray[float], solver: str, seed) -> tuple:
+    """
+    Solves a spatially ordered chunk of targets with one warm-started IKSession, used by solve_many.
+
+    :param robot: num_seg, seg_len, num_of_el, di and angle_limits of the robot.
+    :param targets: (K, 3) target points ordered by proximity.
+    :param solver: Key of ik_solver.SOLVERS, ik_solver.DEFAULT_SOLVER if None.
+    :param seed: Seed of the solver's random number generator.
+
+    :return: (K, 2*num_seg) angles (NaN rows where no solution was found) and (K,) status strings.
+    """
+    session = IKSession(**robot, solver=create_solver(solver, seed=seed),
+                        index=_worker_index)
+    angles = np.full((len(targets), 2 * robot['num_seg']), np.nan)
+    status = np.full(len(targets), 'solved', dtype=object)
+    for i, target in enumerate(targets):
+        result = session.solve(target)
+        if result.size == 1:
+            status[i] = 'unreachable' if isinstance(result, UnreachableTarget) else 'not found'
+        else:
+            angles[i] = result
+    return angles, status
+
+
+def proximity_order(points: np.ndarray[float], bits: int = 10) -> np.ndarray[int]:
+    """
+    Orders points along a Z-order (Morton) curve, consecutive points of the order are spatially close.
+
+    :param points: (N, 3) coordinates.
+    :param bits: Quantization of every axis (2^bits cells).
+
+    :return: (N,) permutation of the points.
+    """
+    points = np.asarray(points, dtype=float)
+    low = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - low, 1e-12)
+    cell = np.minimum((points - low) / extent * (1 << bits), (1 << bits) - 1).astype(np.int64)
+    key = np.zeros(len(points), dtype=np.int64)
+    for bit in range(bits):  # interleave bits of x, y and z
+        for axis in range(3):
+            key |= ((cell[:, axis] >> bit) & 1) << (3 * bit + axis)
+    return np.argsort(key, kind='stable')
+
+
+def solve_many(num_seg: int,
+               seg_len: np.ndarray[float],
+               num_of_el: np.ndarray[int],
+               di: float,
+               angle_limits: np.ndarray[int],
+               targets: np.ndarray[float],
+               solver: str = None,
+               index=None,
+               workers: int = None,
+               chunk_size: int = None,
+               seed=None) -> tuple[np.ndarray[float], np.ndarray[str]]:
+    """
+    Function solves inverse kinematics of many targets of the same robot. Targets are ordered by spatial proximity
+    and split into contiguous chunks, every chunk is solved in a process pool by a warm-started IKSession (each target
+    starts from the solution of its neighbour). The workspace index is loaded or built once and shared by all
+    workers.
+
+    :param num_seg: Number of segments
+    :param seg_len: Lengths of the segments [m]
+    :param num_of_el: Number of elements per segment
+    :param di: Arc end connection distance from origin of local coordinate system [m]
+    :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+    :param targets: (N, 3) target points (Ex, Ey, Ez).
+    :param solver: Key of ik_solver.SOLVERS, ik_solver.DEFAULT_SOLVER if None.
+    :param index: WorkspaceIndex of the robot, or .npz path for WorkspaceIndex.load_or_build, None disables it.
+    :param workers: Number of worker processes, os.cpu_count() by default, 1 solves in the calling process.
+    :param chunk_size: Number of targets per task, N / workers by default.
+    :param seed: Seed of the solvers' random number generators.
+
+    :return: (N, 2*num_seg) configuration space angles (theta, phi) in degrees, NaN rows where no solution was found,
+        and (N,) status ('solved', 'unreachable' or 'not found') in the order of targets.
+    """
+    targets = np.atleast_2d(np.asarray(targets, dtype=float))
+    robot = dict(num_seg=num_seg, seg_len=np.asarray(seg_len, dtype=float), num_of_el=np.asarray(num_of_el), di=di,
+                 angle_limits=np.asarray(angle_limits))
+    if len(targets) == 0:
+        return np.empty((0, 2 * num_seg)), np.empty(0, dtype=object)
+    if isinstance(index, str):
+        index = WorkspaceIndex.load_or_build(index, **robot)
+    workers = os.cpu_count() if workers is None else workers
+    chunk_size = int(np.ceil(len(targets) / workers)) if chunk_size is None else chunk_size
+    order = proximity_order(targets)
+    chunks = [order[start:start + chunk_size] for start in range(0, len(targets), chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [(robot, targets[chunk], solver, chunk_seed) for chunk, chunk_seed in zip(chunks, seeds)]
+    if workers == 1:
+        _init_worker(index)
+        results = [_solve_chunk(*arg) for arg in args]
+        _init_worker(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as executor:
+            results = list(executor.map(_solve_chunk, *zip(*args)))
+
+    angles = np.full((len(targets), 2 * num_seg), np.nan)
+    status = np.empty(len(targets), dtype=object)
+    for chunk, (chunk_angles, chunk_status) in zip(chunks, results):
+        angles[chunk] = chunk_angles
+        status[chunk] = chunk_status
+    return angles, status
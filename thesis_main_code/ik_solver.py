@@ -0,0 +1,39 @@
+"""
+Common interface of the inverse kinematics solvers.
+
+Every solver is a class with optimize(num_seg, seg_len, num_of_el, di, angle_limits, target_pos, initial_guess=None,
+callback=None, time_budget=None) method returning configuration space angles (theta..., phi... [deg]),
+np.array([0.0]) if no solution was found or UnreachableTarget, and with SolverStats of the last call in self.stats
+(diagnostics: evaluations, iterations, wall time, residual).
+"""
+from analytic_ik import AnalyticInverseKinematics
+from cmaes_algorithm import CovarianceMatrixAdaptation
+from de_algorithm import DifferentialEvolution
+from dls_algorithm import DampedLeastSquares
+from pso_algorithm import ParticleSwarmOptimization
+
+SOLVERS = {'analytic': AnalyticInverseKinematics,
+           'pso': ParticleSwarmOptimization,
+           'cmaes': CovarianceMatrixAdaptation,
+           'de': DifferentialEvolution,
+           'dls': DampedLeastSquares}
+
+# Default backend, the fewest FK evaluations and the shortest wall time per solve for 1-4 segments in benchmark.py
+DEFAULT_SOLVER = 'analytic'
+
+
+def create_solver(name: str = None, seed=None):
+    """
+    Function creates an inverse kinematics solver.
+
+    :param name: Key of SOLVERS, DEFAULT_SOLVER if None.
+    :param seed: Seed of the random generator (stochastic solvers only).
+
+    :return: Solver object.
+    """
+    name = DEFAULT_SOLVER if name is None else name
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown solver '{name}', available: {', '.join(SOLVERS)}")
+    if name == 'dls':
+        return SOLVERS[name]()
+    return SOLVERS[name](seed=seed)
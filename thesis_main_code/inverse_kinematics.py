@@ -1,40 +1,230 @@
+import os
 import numpy as np
-from pso_algorithm import ParticleSwarmOptimization
-from forward_kinematics import piecewise_cc
-
-
-def reachable_ep(target: np.array, num_seg: int, seg_len: np.array, num_of_el: np.array, di: float):
-
-    # Finding a random solution for IK
-    pso_object = ParticleSwarmOptimization()
-    result = pso_object.optimize(num_seg=num_seg,
-                                 seg_len=seg_len,
-                                 num_of_el=num_of_el,
-                                 di=di,
-                                 target_pos=target)
-    # Calculation of reachable EP poses of section 1.
-    j = True
-    phi_1 = result[num_seg]
-    theta_1 = result[0]
-    while j:
-        # p1_specific = pos_1
-        theta_1 += 1
-        pos_1 = piecewise_cc(num_seg=1,
-                             theta=theta_1,
-                             phi=phi_1,
-                             seg_len=seg_len[0],
-                             di=di,
-                             num_of_el=num_of_el[0],
-                             optimizer=True)
-        pos2_exists = # function()
-        # TODO: Check the existence of pos_2 using PSO
-        if not pos2_exists:
-            j = False
-
-
-# TODO select algorithm based on how many sections user selected
-reachable_ep(target=np.array([0.008943704370872637, 0.0, 0.022721292000777805]),
-             num_seg=1,
-             seg_len=np.array([0.025]),
-             num_of_el=np.array([10]),
-             di=0.005)
+from concurrent.futures import ProcessPoolExecutor
+from forward_kinematics import piecewise_cc_batch
+
+
+class ReachableWorkspace:
+    """
+    Voxel occupancy grid of reachable end-point positions.
+
+    origin: (x, y, z) coordinates of the grid corner [m].
+    voxel_size: Edge length of a voxel [m].
+    occupancy: 3D boolean array, True where at least one sampled end point lies in the voxel or within dilation
+    voxels from it.
+    dilation: Number of voxels the sampled voxels were grown by, covering the end points between the samples.
+    """
+    def __init__(self, origin: np.ndarray[float], voxel_size: float, occupancy: np.ndarray[bool], dilation: int = 0):
+        self.origin = origin
+        self.voxel_size = voxel_size
+        self.occupancy = occupancy
+        self.dilation = dilation
+
+    def voxel_index(self, points: np.ndarray[float]) -> np.ndarray[int]:
+        """Integer (ix, iy, iz) voxel coordinates of points."""
+        return np.floor((np.asarray(points, dtype=float) - self.origin) / self.voxel_size).astype(int)
+
+    def contains(self, target_pos: np.ndarray[float]) -> np.ndarray[bool]:
+        """
+        Checks if the robot can reach the target point(s). Points up to (dilation + 1) * sqrt(3) * voxel_size from a
+        sampled end point may be reported as reachable (false positives). Reachable points are missed only in voxels
+        that no sample reached, i.e. in sparsely reached regions of the workspace (false negatives).
+        workspace_accuracy measures both rates against dense sampling.
+
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez) or (N, 3) array of points.
+
+        :return: True for points inside occupied voxels.
+        """
+        index = self.voxel_index(target_pos)
+        inside = np.all((index >= 0) & (index < self.occupancy.shape), axis=-1)
+        index = np.where(inside[..., None], index, 0)
+        return inside & self.occupancy[index[..., 0], index[..., 1], index[..., 2]]
+
+    def save(self, path: str):
+        """Stores the grid into .npz file."""
+        np.savez_compressed(path, origin=self.origin, voxel_size=self.voxel_size, occupancy=self.occupancy,
+                            dilation=self.dilation)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads grid stored by save."""
+        with np.load(path) as data:
+            dilation = int(data['dilation']) if 'dilation' in data else 0
+            return cls(data['origin'], float(data['voxel_size']), data['occupancy'], dilation)
+
+
+def _workspace_chunk(robot: dict, limits: tuple, seed, count: int, workspace: dict, return_points: bool):
+    """
+    Computes end points of count random configurations, used by reachable_ep worker processes.
+
+    :param robot: num_seg, seg_len, num_of_el and di of the robot.
+    :param limits: Theta max and phi max [deg].
+    :param seed: Seed (np.random.SeedSequence) of the chunk's random number stream.
+    :param count: Number of sampled configurations.
+    :param workspace: origin, voxel_size and shape of the voxel grid.
+    :param return_points: If true the end points are returned too.
+
+    :return: Linear indices of occupied voxels and (count, 3) float32 end points or None.
+    """
+    rng = np.random.default_rng(seed)
+    num_seg = robot['num_seg']
+    theta = rng.uniform(0, limits[0], [count, num_seg])
+    phi = rng.uniform(0, limits[1], [count, num_seg])
+    points = piecewise_cc_batch(theta=theta, phi=np.deg2rad(phi), optimizer=True, **robot)
+    index = np.floor((points - workspace['origin']) / workspace['voxel_size']).astype(int)
+    index = np.clip(index, 0, np.array(workspace['shape']) - 1)
+    occupied = np.unique(np.ravel_multi_index(index.T, workspace['shape']))
+    return occupied, points.astype(np.float32) if return_points else None
+
+
+def dilate(occupancy: np.ndarray[bool], radius: int) -> np.ndarray[bool]:
+    """
+    Grows the occupied voxels by radius voxels along every axis (cube neighbourhood).
+
+    :param occupancy: 3D boolean array.
+    :param radius: Number of voxels.
+
+    :return: Dilated 3D boolean array.
+    """
+    for axis in range(occupancy.ndim):
+        grown = occupancy.copy()
+        length = occupancy.shape[axis]
+        for shift in range(1, min(radius, length - 1) + 1):
+            lower = [slice(None)] * occupancy.ndim
+            upper = [slice(None)] * occupancy.ndim
+            lower[axis], upper[axis] = slice(0, length - shift), slice(shift, length)
+            grown[tuple(lower)] |= occupancy[tuple(upper)]
+            grown[tuple(upper)] |= occupancy[tuple(lower)]
+        occupancy = grown
+    return occupancy
+
+
+def reachable_ep(num_seg: int,
+                 seg_len: np.ndarray[float],
+                 num_of_el: np.ndarray[int],
+                 di: float,
+                 angle_limits: np.ndarray[int],
+                 num_samples: int = None,
+                 voxel_size: float = None,
+                 dilation: int = 1,
+                 points_path: str = None,
+                 workers: int = None,
+                 chunk_size: int = 100000,
+                 convergence: float = 0.002,
+                 max_samples: int = 20000000,
+                 seed=0) -> ReachableWorkspace:
+    """
+    Function computes the reachable end-point workspace of the robot from random configuration space angles within
+    angle_limits, in parallel chunks across processes. The number of samples follows the number of reachable voxels:
+    sampling runs in rounds until a round adds less than convergence of the occupied voxels, so the map of a
+    single-segment robot (surface) needs far fewer samples than the map of a multi-segment one (volume).
+
+    :param num_seg: Number of segments
+    :param seg_len: Lengths of the segments [m]
+    :param num_of_el: Number of elements per segment
+    :param di: Arc end connection distance from origin of local coordinate system [m]
+    :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+    :param num_samples: Fixed number of sampled configurations instead of the rounds.
+    :param voxel_size: Edge length of a voxel [m], 1/100 of the robot length by default.
+    :param dilation: Number of voxels the sampled voxels are grown by (end points between samples of neighbouring
+        voxels), see ReachableWorkspace.contains.
+    :param points_path: If given, all end points are stored into this (N, 3) float32 .npy file (memory-mappable).
+    :param workers: Number of worker processes, os.cpu_count() by default, 1 computes in the calling process.
+    :param chunk_size: Number of configurations computed by one task.
+    :param convergence: Sampling stops when a round adds less than this fraction of occupied voxels.
+    :param max_samples: Maximal number of sampled configurations of the rounds.
+    :param seed: Seed of the random number generator.
+
+    :return: ReachableWorkspace voxel grid.
+    """
+    seg_len = np.asarray(seg_len, dtype=float)
+    robot = dict(num_seg=num_seg, seg_len=seg_len, num_of_el=np.asarray(num_of_el), di=di)
+    limits = (float(np.max(angle_limits[0])), float(np.max(angle_limits[1])))
+
+    # Voxel grid around the bounding sphere of the robot
+    length = float(np.sum(seg_len[:num_seg]))
+    voxel_size = length / 100 if voxel_size is None else voxel_size
+    origin = np.full(3, -length)
+    shape = (int(np.ceil(2 * length / voxel_size)) + 1,) * 3
+    workspace = dict(origin=origin, voxel_size=voxel_size, shape=shape)
+
+    workers = os.cpu_count() if workers is None else workers
+    limit = max_samples if num_samples is None else num_samples
+    seeds = np.random.SeedSequence(seed)
+    occupancy = np.zeros(shape, dtype=bool)
+    points = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        sampled = 0
+        while sampled < limit:
+            counts = [min(chunk_size, limit - sampled - k * chunk_size) for k in range(workers)]
+            args = [(robot, limits, chunk_seed, count, workspace, points_path is not None)
+                    for chunk_seed, count in zip(seeds.spawn(workers), counts) if count > 0]
+            if executor is None:
+                chunks = [_workspace_chunk(*arg) for arg in args]
+            else:
+                chunks = list(executor.map(_workspace_chunk, *zip(*args)))
+            sampled += sum(arg[3] for arg in args)
+            occupied = np.unique(np.concatenate([chunk[0] for chunk in chunks]))
+            added = np.count_nonzero(~occupancy.flat[occupied])
+            occupancy.flat[occupied] = True
+            points += [chunk[1] for chunk in chunks if chunk[1] is not None]
+            if num_samples is None and added < convergence * np.count_nonzero(occupancy):
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if points_path is not None:
+        np.save(points_path, np.concatenate(points))
+    return ReachableWorkspace(origin, voxel_size, dilate(occupancy, dilation), dilation)
+
+
+def workspace_accuracy(workspace: ReachableWorkspace,
+                       num_seg: int,
+                       seg_len: np.ndarray[float],
+                       num_of_el: np.ndarray[int],
+                       di: float,
+                       angle_limits: np.ndarray[int],
+                       num_samples: int = 20000000,
+                       num_points: int = 10000,
+                       seed=1) -> dict:
+    """
+    Function compares the workspace map with dense random sampling of the configuration space (independent of the
+    map's samples).
+
+    :param workspace: ReachableWorkspace of the robot.
+    :param num_seg, seg_len, num_of_el, di, angle_limits: Robot parameters, see reachable_ep.
+    :param num_samples: Number of configurations of the dense reference map (without dilation).
+    :param num_points: Number of random reachable end points of the false negative rate.
+    :param seed: Seed of the random number generator.
+
+    :return: dict with reported and reference (fraction of voxels of the bounding sphere occupied in the map and in
+        the dense reference), false_positive (fraction of the sphere voxels occupied in the map but not in the
+        reference) and false_negative (fraction of reachable end points not contained in the map).
+    """
+    reference = reachable_ep(num_seg, seg_len, num_of_el, di, angle_limits, num_samples=num_samples,
+                             voxel_size=workspace.voxel_size, dilation=0, seed=seed)
+    shape = workspace.occupancy.shape
+    centers = [workspace.origin[0] + (np.arange(size) + 0.5) * workspace.voxel_size for size in shape]
+    radius = -workspace.origin[0]
+    sphere = (centers[0][:, None, None] ** 2 + centers[1][None, :, None] ** 2 + centers[2][None, None, :] ** 2 <=
+              radius ** 2)
+    rng = np.random.default_rng(seed + 1)
+    theta = rng.uniform(0, np.max(angle_limits[0]), [num_points, num_seg])
+    phi = rng.uniform(0, np.max(angle_limits[1]), [num_points, num_seg])
+    points = piecewise_cc_batch(num_seg=num_seg, theta=theta, phi=np.deg2rad(phi), seg_len=np.asarray(seg_len),
+                                di=di, num_of_el=np.asarray(num_of_el), optimizer=True)
+    volume = np.count_nonzero(sphere)
+    return {'reported': np.count_nonzero(workspace.occupancy & sphere) / volume,
+            'reference': np.count_nonzero(reference.occupancy & sphere) / volume,
+            'false_positive': np.count_nonzero(workspace.occupancy & ~reference.occupancy & sphere) / volume,
+            'false_negative': float(np.mean(~workspace.contains(points)))}
+
+
+if __name__ == '__main__':
+    reachable = reachable_ep(num_seg=1,
+                             seg_len=np.array([0.025]),
+                             num_of_el=np.array([10]),
+                             di=0.005,
+                             angle_limits=np.array([90, 360]))
+    print(reachable.contains(np.array([0.008943704370872637, 0.0, 0.022721292000777805])))
@@ -0,0 +1,176 @@
+import time
+import numpy as np
+from abc import ABC, abstractmethod
+from forward_kinematics import piecewise_cc_batch
+from reachability import reachability_check
+from solver_stats import SolverStats
+
+
+class PopulationAlgorithm(ABC):
+    """
+    Base class of population based inverse kinematics solvers (CMA-ES, differential evolution). Implements the common
+    solver interface (same optimize signature and result as ParticleSwarmOptimization): bounds, batched objective
+    function evaluating the whole population in one forward kinematics call, restarts, warm start, callback, anytime
+    mode and telemetry. Subclasses implement initialization and iteration on positions normalized to [0, 1].
+    """
+    name = 'population'
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.max_restarts = 21
+        self.max_iter = 45
+        self.min_error = 0.0001  # in meters
+        self.best_pos = None  # best position found over all restarts
+        self.best_cost = None
+        self.stats = None  # SolverStats of the last optimize call
+
+    @abstractmethod
+    def initialization(self, objective, dimension: int, guess: np.ndarray[float] = None):
+        """
+        Creates and evaluates the first population.
+
+        :param objective: Function returning errors of (population_size, dimension) normalized positions.
+        :param dimension: Number of optimized variables (2*num_seg in optimize).
+        :param guess: Normalized initial guess or None.
+
+        :return: best_pos, best_cost of the population.
+        """
+
+    @abstractmethod
+    def iteration(self, objective, iteration: int):
+        """
+        One generation of the algorithm.
+
+        :param objective: Function returning errors of (population_size, dimension) normalized positions.
+        :param iteration: Iteration number within the actual restart.
+
+        :return: best_pos, best_cost of the generation.
+        """
+
+    def optimize(self,
+                 num_seg: int,
+                 seg_len: np.ndarray[float],
+                 num_of_el: np.ndarray[int],
+                 di: float,
+                 angle_limits: np.ndarray[int],
+                 target_pos: np.ndarray[float],
+                 initial_guess: np.ndarray[float] = None,
+                 callback=None,
+                 time_budget: float = None) -> np.ndarray[float]:
+        """
+        Function search for possible solution of Inverse Kinematics.
+
+        :param num_seg: Number of segments
+        :param seg_len: Lengths of the segments  [m]
+        :param num_of_el: Number of elements per segment
+            if n=1 all segments with equal number of points
+        :param di: Arc end connection distance from origin of local coordinate system [m]
+        :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+        :param initial_guess: Configuration space angles (theta, phi) of a previous solution, the first population is
+            concentrated around it (warm start), restarts are uniform random.
+        :param callback: Function callback(stats, best_pos) called after every iteration with SolverStats and actual
+            best position, if it returns True the search is stopped.
+        :param time_budget: Anytime mode, time limit of the search [s]. When the limit is reached or restarts run out,
+            the best configuration found so far is returned instead of np.array([0.0]).
+
+        :return: final_params: Configuration space angles, UnreachableTarget for targets outside of the workspace.
+            Convergence telemetry of the call is stored in self.stats.
+        """
+        self.stats = SolverStats(self.name)
+        unreachable = reachability_check(num_seg=num_seg, seg_len=seg_len, angle_limits=angle_limits,
+                                         target_pos=target_pos)
+        if unreachable is not None:  # reject targets outside of the workspace without searching
+            self.stats.finish(converged=False)
+            return unreachable
+        #                                            SETUP PARAMETERS                                            #
+        lower = np.zeros(2 * num_seg)  # boundary conditions for every section of CR
+        upper = np.concatenate((np.full(num_seg, float(np.max(angle_limits[0]))),
+                                np.full(num_seg, float(np.max(angle_limits[1])))))
+
+        def objective_function(parameters):
+            """
+            Distance between end points of population and the target point, one batched FK call.
+
+            :param parameters: [np.array] (population_size, 2*num_seg) configuration space angles
+
+            :return error: [np.array] Calculated error of every member
+            """
+            end_pos = piecewise_cc_batch(num_seg=num_seg,
+                                         theta=parameters[:, :num_seg],  # the first half of the columns are theta's
+                                         phi=np.deg2rad(parameters[:, num_seg:]),  # the second half are phi's
+                                         seg_len=seg_len,
+                                         di=di,
+                                         num_of_el=num_of_el,
+                                         optimizer=True)
+            return np.linalg.norm(target_pos - end_pos, axis=1)
+
+        return self.search(objective_function, lower, upper, initial_guess, callback, time_budget, self.min_error)
+
+    def search(self,
+               objective,
+               lower: np.ndarray[float],
+               upper: np.ndarray[float],
+               initial_guess: np.ndarray[float] = None,
+               callback=None,
+               time_budget: float = None,
+               min_error: float = 0.0001) -> np.ndarray[float]:
+        """
+        Minimizes objective within bounds, the search loop of optimize. Records evaluations and result into
+        self.stats, which has to be created by the caller.
+
+        :param objective: Function returning errors [m] of (population_size, dimension) parameters.
+        :param lower: Lower bounds of the parameters.
+        :param upper: Upper bounds of the parameters.
+        :param initial_guess: Parameters of the warm start.
+        :param callback: Function callback(stats, best_pos), see optimize.
+        :param time_budget: Time limit of the search [s], see optimize.
+        :param min_error: Error [m] at which the search is finished.
+
+        :return: Best parameters, np.array([0.0]) if min_error was not reached (except anytime mode).
+        """
+        deadline = None if time_budget is None else self.stats.start + time_budget
+
+        #                                             HELPER FUNCTIONS                                            #
+        def objective_function(X):
+            """Objective of positions X normalized to [0, 1]."""
+            self.stats.evaluations += len(X)
+            return objective(lower + np.clip(X, 0, 1) * (upper - lower))
+
+        def record_best(position, cost):
+            """Keeps the best position over all restarts."""
+            if self.best_cost is None or cost < self.best_cost:
+                self.best_pos, self.best_cost = np.array(position), float(cost)
+
+        def finish(converged):
+            """Records the result into stats and returns it, in anytime mode failure returns best position so far."""
+            if converged or time_budget is not None:
+                self.stats.finish(converged=converged, residual=self.best_cost)
+                return lower + np.clip(self.best_pos, 0, 1) * (upper - lower)
+            self.stats.finish(converged=False)
+            return np.array([0.0])
+
+        #                                               MAIN LOOP                                                 #
+        self.best_pos = self.best_cost = None
+        guess = None
+        if initial_guess is not None:
+            guess = (np.asarray(initial_guess, dtype=float).ravel() - lower) / np.where(upper > lower, upper - lower, 1)
+        for restart in range(self.max_restarts):
+            self.stats.restarts = restart
+            start = time.perf_counter()
+            record_best(*self.initialization(objective_function, len(lower), guess if restart == 0 else None))
+            self.stats.add_time('initialization', start)
+            for i in range(self.max_iter):
+                if self.best_cost <= min_error:
+                    return finish(converged=True)
+                start = time.perf_counter()
+                record_best(*self.iteration(objective_function, i))
+                self.stats.add_time('iteration', start)
+                self.stats.iterations += 1
+                self.stats.cost_history.append(self.best_cost)
+                if callback is not None and callback(self.stats, lower + self.best_pos * (upper - lower)):
+                    self.stats.finish(converged=False)
+                    return np.array([0.0])  # stopped by the caller
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return finish(converged=self.best_cost <= min_error)  # time budget spent
+        return finish(converged=self.best_cost <= min_error)
@@ -1,20 +1,74 @@
+import time
 import numpy as np
-from forward_kinematics import piecewise_cc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dls_algorithm import DampedLeastSquares
+from forward_kinematics import piecewise_cc_batch
+from reachability import reachability_check
+from solver_stats import SolverStats, nested
+
+_stop_event = None  # Set in worker processes of parallel optimize, signals that another swarm has converged
+
+
+def _init_worker(stop_event):
+    """Stores shared stop event in the worker process."""
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _swarm_worker(seed, max_restarts, optimize_kwargs, settings):
+    """
+    Runs one independent swarm in a worker process.
+
+    :param seed: Seed (np.random.SeedSequence) of the swarm's own random number stream.
+    :param max_restarts: Restart budget of this swarm.
+    :param optimize_kwargs: Keyword arguments of ParticleSwarmOptimization.optimize.
+    :param settings: min_error, polish_tolerance, deadline (time.monotonic() value shared by the processes, or
+        None) and stats id of the parent solver.
+
+    :return: Configuration space angles or np.array([0.0]) and SolverStats of the swarm.
+    """
+    pso_object = ParticleSwarmOptimization(seed=seed, polish_tolerance=settings['polish_tolerance'])
+    pso_object.max_restarts = max_restarts
+    pso_object.min_error = settings['min_error']
+    if settings['deadline'] is not None:  # time spent by process startup is taken from the swarm's budget
+        optimize_kwargs = dict(optimize_kwargs, time_budget=max(settings['deadline'] - time.monotonic(), 0.0))
+    with nested(settings['parent']):
+        return pso_object.optimize(**optimize_kwargs), pso_object.stats
 
 
 class ParticleSwarmOptimization:
     """
     Class includes method optimize for PSO which returns configuration space variables (theta, phi)
 
+    Hybrid mode (polish_tolerance set): once the global best is within polish_tolerance from the target, it is refined
+    by damped least squares (Gauss-Newton) to min_error, so min_error can be tightened to tens of microns without the
+    swarm iterating on the last fraction of a millimetre.
+
     Sources:
     [1] https://gist.github.com/ljvmiranda921/7d8c48da0aa7565f0b3c01d7c951c5e9
     [2] https://pyswarms.readthedocs.io/en/development/examples/inverse_kinematics.html
     """
-    def __init__(self):
+    def __init__(self, seed=None, polish_tolerance: float = None):
+        self.rng = np.random.default_rng(seed)
+        self.max_restarts = 21
+        self.min_error = 0.0001  # in meters
+        self.polish_tolerance = polish_tolerance  # in meters, None disables the hybrid mode
+        self.collect_share = 0.1  # part of time budget reserved for collecting results of parallel swarms
+        self.refiner = DampedLeastSquares()  # local optimizer of the hybrid mode
+        self.pool = None  # process pool of parallel optimize, created on first use and kept until close
+        self.pool_workers = 0
+        self.stop_event = None  # shared with the pool processes, stops the swarms
+        self.dropped = set()  # swarms dropped at the deadline of the last parallel call, still stopping
         self.current_pos = None
         self.p_best_pos = None
         self.g_best_pos = None
         self.velocity = None
+        self.p_best_cost = None
+        self.g_best_cost = None
+        self.best_pos = None  # best position found over all restarts
+        self.best_cost = None
+        self.stats = None  # SolverStats of the last optimize call
 
     def optimize(self,
                  num_seg: int,
@@ -22,7 +76,11 @@ class ParticleSwarmOptimization:
                  num_of_el: np.ndarray[int],
                  di: float,
                  angle_limits: np.ndarray[int],
-                 target_pos: np.ndarray[float]) -> np.ndarray[float]:
+                 target_pos: np.ndarray[float],
+                 workers: int = 1,
+                 initial_guess: np.ndarray[float] = None,
+                 callback=None,
+                 time_budget: float = None) -> np.ndarray[float]:
         """
         Function search for possible solution of Inverse Kinematics.
 
@@ -33,80 +91,97 @@ class ParticleSwarmOptimization:
         :param di: Arc end connection distance from origin of local coordinate system [m]
         :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
         :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+        :param workers: Number of independent swarms run concurrently in a process pool, restart budget is split
+            between them and the first converged swarm cancels the others. The process pool is kept for the next
+            calls until close().
+        :param initial_guess: Configuration space angles (theta, phi) of a previous solution, part of the first swarm
+            is concentrated around it (warm start), restarts are uniform random.
+        :param callback: Function callback(stats, g_best_pos) called after every iteration with SolverStats and actual
+            global best position, if it returns True the search is stopped. Not called from parallel swarms.
+        :param time_budget: Anytime mode, time limit of the search [s]. When the limit is reached or restarts run out,
+            the best configuration found so far is returned instead of np.array([0.0]), self.stats.converged tells
+            if it is within min_error and self.stats.residual gives its error.
 
-        :return: final_params: Configuration space angles
+        :return: final_params: Configuration space angles, UnreachableTarget for targets outside of the workspace.
+            Convergence telemetry of the call is stored in self.stats.
         """
-        num_seg = num_seg
-        seg_len = seg_len
-        num_of_el = num_of_el
-        di = di
-        target_pos = target_pos
+        self.stats = SolverStats('pso')
+        unreachable = reachability_check(num_seg=num_seg, seg_len=seg_len, angle_limits=angle_limits,
+                                         target_pos=target_pos)
+        if unreachable is not None:  # reject targets outside of the workspace without searching
+            self.stats.finish(converged=False)
+            return unreachable
+        if workers > 1:
+            return self.optimize_parallel(workers=workers,
+                                          optimize_kwargs=dict(num_seg=num_seg, seg_len=seg_len, num_of_el=num_of_el,
+                                                               di=di, angle_limits=angle_limits,
+                                                               target_pos=target_pos, initial_guess=initial_guess,
+                                                               time_budget=time_budget))
         #                                            SETUP PARAMETERS                                            #
         swarm_size = 15
         max_iter = 45
         params = np.zeros((num_seg * 2, 1))  # start with all angles set to 0
-        min_error = 0.0001  # in meters
+        min_error = self.min_error
         influence = {'c1': 1.2, 'c2': 1.2}  # c1 - personal, c2 - social
         bounds = {'theta_min': 0,
                   'theta_max': angle_limits[0],
                   'phi_min': 0,
                   'phi_max': angle_limits[1]}  # boundary conditions for every section of CR
         v_initial = np.zeros((1, num_seg * 2))  # initial velocity starts wi
+        warm_start = {'fraction': 0.5, 'spread': 0.05}  # part of the swarm around initial_guess, std. dev. of range
 
         #                                             HELPER FUNCTIONS                                            #
-        def boundary_condition(element, algorithm):
+        def boundary_condition(algorithm):
             """
-            Function applies lower and upper bound limits.
+            Function applies lower and upper bound limits to the whole swarm.
 
-            :param element: n dimensional particle
             :param algorithm: 'x' or 'v' selects whether you want to update velocity or position
             """
             if algorithm == 'x':
-                self.current_pos[element, :num_seg] = np.clip(self.current_pos[element, :num_seg], bounds['theta_min'],
-                                                              bounds['theta_max'])  # second half are phis
-                self.current_pos[element, num_seg:] = np.clip(self.current_pos[element, num_seg:], bounds['phi_min'],
-                                                              bounds['phi_max'])  # second half are phis
+                self.current_pos[:, :num_seg] = np.clip(self.current_pos[:, :num_seg], bounds['theta_min'],
+                                                        bounds['theta_max'])  # first half are thetas
+                self.current_pos[:, num_seg:] = np.clip(self.current_pos[:, num_seg:], bounds['phi_min'],
+                                                        bounds['phi_max'])  # second half are phis
             if algorithm == 'v':
                 theta_v_max = bounds['theta_max'] - bounds['theta_min']
                 theta_v_min = - theta_v_max
                 phi_v_max = bounds['phi_max'] - bounds['phi_min']
                 phi_v_min = - phi_v_max
-                self.velocity[element, :num_seg] = np.clip(self.velocity[element, :num_seg], theta_v_min,
-                                                           theta_v_max)  # second half are phis
-                self.velocity[element, num_seg:] = np.clip(self.velocity[element, num_seg:], phi_v_min,
-                                                           phi_v_max)  # second half are phis
+                self.velocity[:, :num_seg] = np.clip(self.velocity[:, :num_seg], theta_v_min,
+                                                     theta_v_max)  # first half are thetas
+                self.velocity[:, num_seg:] = np.clip(self.velocity[:, num_seg:], phi_v_min,
+                                                     phi_v_max)  # second half are phis
 
         def end_tip_position(parameters):
             """
-            Calculates forward kinematics and returns last's segment endpoint position.
+            Calculates forward kinematics of the whole population in one batched call and returns last's segment
+            endpoint positions.
 
-            :param parameters: [np.array] Input angle configuration space variables (theta, phi)
+            :param parameters: [np.array] (swarm_size, 2*num_seg) input angle configuration space variables (theta, phi)
 
-            :return ep_pos: [np.array] Endpoint position [Ex, Ey, Ez]
+            :return ep_pos: [np.array] (swarm_size, 3) endpoint positions [Ex, Ey, Ez]
             """
-            end_pos = piecewise_cc(num_seg=num_seg,
-                                   theta=parameters[:num_seg],  # the first half of  the list are theta's
-                                   phi=np.deg2rad(parameters[num_seg:]),  # the second half of the list are phi's
-                                   seg_len=seg_len,
-                                   di=di,
-                                   num_of_el=num_of_el,
-                                   optimizer=True)
+            end_pos = piecewise_cc_batch(num_seg=num_seg,
+                                         theta=parameters[:, :num_seg],  # the first half of the columns are theta's
+                                         phi=np.deg2rad(parameters[:, num_seg:]),  # the second half are phi's
+                                         seg_len=seg_len,
+                                         di=di,
+                                         num_of_el=num_of_el,
+                                         optimizer=True)
             return end_pos
 
         def objective_function(X, target):
             """
-            Calculates the difference between two points in space and returns error vector norm.
+            Calculates the distance between the end points of the population and the target point.
 
             :param X: [np.array] Population of swarm
             :param target: [np.array] Coordinates of the target point (Ex, Ey, Ez)
 
-            :return error: Calculated error
+            :return error: [np.array] Calculated error of every particle
             """
-            test_pos = end_tip_position(X)
-            x_dist = target[0] - test_pos[0]
-            y_dist = target[1] - test_pos[1]
-            z_dist = target[2] - test_pos[2]
-            error = np.linalg.norm([x_dist, y_dist, z_dist])
+            test_pos = end_tip_position(np.atleast_2d(X))
+            error = np.linalg.norm(target - test_pos, axis=1)
+            self.stats.evaluations += len(test_pos)
             return error
 
         def inertia_weight_update(iteration, max_iteration):
@@ -122,69 +197,220 @@ class ParticleSwarmOptimization:
             w = w_max - (w_max-w_min)/max_iteration*iteration
             return w
 
-        def initialization():
+        def initialization(guess=None):
             """
             Initialization of PSO, generating random position for x_i, initialize velocity with zeros, definition of
-            current position (current_pos), personal best position(p_best_pos), global best position (g_best_pos).
+            current position (current_pos), personal best position(p_best_pos), global best position (g_best_pos)
+            and their cached costs.
+
+            :param guess: [np.array] Configuration space angles, if given part of the swarm is placed around them
             """
+            start = time.perf_counter()
             # Random position 'angle value' for particles
-            current_pos_theta = np.random.uniform(bounds['theta_min'], bounds['theta_max'], [swarm_size, num_seg])
-            current_pos_phi = np.random.uniform(bounds['phi_min'], bounds['phi_max'], [swarm_size, num_seg])
+            current_pos_theta = self.rng.uniform(bounds['theta_min'], bounds['theta_max'], [swarm_size, num_seg])
+            current_pos_phi = self.rng.uniform(bounds['phi_min'], bounds['phi_max'], [swarm_size, num_seg])
             self.current_pos = np.concatenate((current_pos_theta, current_pos_phi), axis=1)
+            if guess is not None:
+                num_warm = int(np.ceil(swarm_size * warm_start['fraction']))
+                theta_spread = warm_start['spread'] * (bounds['theta_max'] - bounds['theta_min'])
+                phi_spread = warm_start['spread'] * (bounds['phi_max'] - bounds['phi_min'])
+                self.current_pos[:num_warm, :num_seg] = guess[:num_seg] + self.rng.normal(0, 1, [num_warm, num_seg]) * \
+                    theta_spread
+                self.current_pos[:num_warm, num_seg:] = guess[num_seg:] + self.rng.normal(0, 1, [num_warm, num_seg]) * \
+                    phi_spread
+                self.current_pos[0, :] = guess  # previous solution itself is one of the particles
+                boundary_condition('x')
             # Current best particle position
             self.p_best_pos = self.current_pos.copy()
+            self.p_best_cost = objective_function(self.current_pos, target_pos)
             # Current best global position
-            J = []
-            for j in range(swarm_size):
-                temp = objective_function(self.current_pos[j], target_pos)  # temp = error
-                J.append(temp)
-            min_error_id = np.argmin(J)  # min error index in J list
-            self.g_best_pos = self.current_pos[min_error_id, :]  # saving min_error population into g_best_pos
+            min_error_id = np.argmin(self.p_best_cost)  # min error index
+            self.g_best_pos = self.p_best_pos[min_error_id, :].copy()  # saving min_error population into g_best_pos
+            self.g_best_cost = self.p_best_cost[min_error_id]
+            if self.best_cost is None or self.g_best_cost < self.best_cost:
+                self.best_pos, self.best_cost = self.g_best_pos, self.g_best_cost
             # Initialize Velocity
             self.velocity = v_initial * np.ones([swarm_size, params.size])
+            self.stats.add_time('initialization', start)
+
+        def polish():
+            """
+            Hybrid mode, refines the global best position by damped least squares and keeps the result if it is
+            better. Evaluations of the local optimizer are added to stats.
+            """
+            start = time.perf_counter()
+            self.refiner.min_error = min_error
+            remaining = np.inf if deadline is None else max(deadline - time.perf_counter(), 0.0)
+            with nested(self.stats.id):
+                result = self.refiner.optimize(num_seg=num_seg, seg_len=seg_len, num_of_el=num_of_el, di=di,
+                                               angle_limits=angle_limits, target_pos=target_pos,
+                                               initial_guess=self.g_best_pos, time_budget=remaining)
+            self.stats.evaluations += self.refiner.stats.evaluations
+            if result.size > 1 and self.refiner.stats.residual < self.g_best_cost:
+                self.g_best_pos, self.g_best_cost = np.array(result), self.refiner.stats.residual
+                if self.g_best_cost < self.best_cost:
+                    self.best_pos, self.best_cost = self.g_best_pos, self.g_best_cost
+            self.stats.add_time('polish', start)
+
+        def finish(result, converged):
+            """Records the result into stats and returns it, in anytime mode failure returns best position so far."""
+            if time_budget is not None and not converged:
+                result = self.best_pos
+            self.stats.finish(converged=converged, residual=self.best_cost if result.size > 1 else None)
+            return result
 
         #                                               MAIN LOOP                                                 #
         i = 0
         stop = 0
-        initialization()
+        self.best_pos = self.best_cost = None
+        deadline = None if time_budget is None else self.stats.start + time_budget
+        initialization(None if initial_guess is None else np.asarray(initial_guess, dtype=float).ravel())
+        polished_cost = np.inf  # global best cost at the last polish, every global best is polished only once
         while True:  # for i in range(max_iter)
             w_i = inertia_weight_update(i, max_iter)
-            cost = objective_function(self.g_best_pos, target_pos)
+            if self.polish_tolerance is not None and min_error < self.g_best_cost <= self.polish_tolerance and \
+                    self.g_best_cost < polished_cost:
+                polish()
+                polished_cost = self.g_best_cost
             # If the cost is greater than the minimal error
-            if cost > min_error:
-                # Update the velocities and position.
-                for part in range(swarm_size):
-                    # Update velocity
-                    cognitive = (influence['c1'] * np.random.uniform(0, 1, [1, num_seg * 2])) * (
-                            self.p_best_pos[part, :] - self.current_pos[part, :])
-                    social = (influence['c2'] * np.random.uniform(0, 1, [1, num_seg * 2])) * (
-                            self.g_best_pos - self.current_pos[part, :])
-                    self.velocity[part, :] = w_i * self.velocity[part, :] + cognitive + social
-                    boundary_condition(part, 'v')
-                    # Update position
-                    self.current_pos[part, :] = self.current_pos[part, :] + self.velocity[part, :]
-                    boundary_condition(part, 'x')
+            if self.g_best_cost > min_error:
+                # Update the velocities and positions of the whole swarm.
+                start = time.perf_counter()
+                cognitive = (influence['c1'] * self.rng.uniform(0, 1, [swarm_size, num_seg * 2])) * (
+                        self.p_best_pos - self.current_pos)
+                social = (influence['c2'] * self.rng.uniform(0, 1, [swarm_size, num_seg * 2])) * (
+                        self.g_best_pos - self.current_pos)
+                self.velocity = w_i * self.velocity + cognitive + social
+                boundary_condition('v')
+                self.current_pos = self.current_pos + self.velocity
+                boundary_condition('x')
+                self.stats.add_time('update', start)
             else:
                 # Return the parameters if the cost is less than the min_error
                 final_params = self.g_best_pos
-                return final_params
-            for particle in range(swarm_size):
-                # Set the personal best option
-                cost_particle = objective_function(self.current_pos[particle, :], target_pos)  # cost_particle = error
-                cost_p_best = objective_function(self.p_best_pos[particle, :], target_pos)
-                if cost_particle < cost_p_best:  # if actual error is lower than the best personal error
-                    self.p_best_pos[particle, :] = self.current_pos[particle, :]  # update new personal best position
-                    # Set the global best option
-                    cost_g_best = objective_function(self.g_best_pos, target_pos)
-                    if cost_p_best < cost_g_best:  # if this particle has lower cost then global best
-                        self.g_best_pos = self.current_pos[particle, :]
+                return finish(final_params, converged=True)
+            # Set the personal best options
+            start = time.perf_counter()
+            cost_particle = objective_function(self.current_pos, target_pos)  # cost_particle = error
+            improved = cost_particle < self.p_best_cost  # if actual error is lower than the best personal error
+            self.p_best_pos[improved, :] = self.current_pos[improved, :]
+            self.p_best_cost[improved] = cost_particle[improved]
+            # Set the global best option
+            best_id = np.argmin(self.p_best_cost)
+            if self.p_best_cost[best_id] < self.g_best_cost:  # if this particle has lower cost then global best
+                self.g_best_pos = self.p_best_pos[best_id, :].copy()
+                self.g_best_cost = self.p_best_cost[best_id]
+                if self.g_best_cost < self.best_cost:
+                    self.best_pos, self.best_cost = self.g_best_pos, self.g_best_cost
+            self.stats.add_time('evaluation', start)
+            self.stats.iterations += 1
+            self.stats.cost_history.append(float(self.g_best_cost))
+            if callback is not None and callback(self.stats, self.g_best_pos):
+                return finish(np.array([0.0]), converged=False)  # stopped by the caller
+            if deadline is not None and time.perf_counter() >= deadline:
+                return finish(self.best_pos, converged=self.best_cost <= min_error)  # time budget spent
 
             i += 1
+            if _stop_event is not None and _stop_event.is_set():
+                return finish(np.array([0.0]), converged=False)  # other swarm already found a solution
             if i == max_iter + 1:
                 # If no good solution was found start again with new random position of particles,
                 # this prevents from convergence to local minima
                 initialization()
+                polished_cost = np.inf  # new swarm, its global best is polished even if above an earlier polish
                 i = 0
                 stop += 1
-                if stop == 21:
-                    return np.array([0.0])
+                self.stats.restarts = stop
+                if stop == self.max_restarts:
+                    return finish(np.array([0.0]), converged=False)
+
+    def optimize_parallel(self, workers: int, optimize_kwargs: dict) -> np.ndarray[float]:
+        """
+        Runs independent swarms in a process pool, each with its own random number stream spawned from self.rng.
+
+        :param workers: Number of swarms (processes).
+        :param optimize_kwargs: Keyword arguments of optimize.
+
+        :return: final_params: Configuration space angles of the first converged swarm, np.array([0.0]) if none.
+            self.stats sums restarts and evaluations of finished swarms, cost history is the one of the result.
+            With time_budget the swarms get the budget left after the pool startup and the call returns at the
+            deadline without waiting for the dropped swarms. Startup of the worker processes (first call) can't be
+            interrupted, budgets shorter than it are exceeded by its duration.
+        """
+        # restart budget split exactly between the swarms
+        max_restarts = [self.max_restarts // workers + (i < self.max_restarts % workers) for i in range(workers)]
+        self.stats.solver = 'pso_parallel'
+        seeds = np.random.SeedSequence(self.rng.integers(2 ** 63)).spawn(workers)
+        executor, stop_event = self.process_pool(workers)
+        result, result_stats = np.array([0.0]), None
+        swarm_stats = []
+        deadline = None  # time budget is measured from the start of this call, including pool startup
+        settings = dict(min_error=self.min_error, polish_tolerance=self.polish_tolerance, deadline=None,
+                        parent=self.stats.id)
+        if optimize_kwargs.get('time_budget') is not None:
+            deadline = time.monotonic() + optimize_kwargs['time_budget'] - (time.perf_counter() - self.stats.start)
+            # swarms stop earlier, so their results are collected before the deadline
+            settings['deadline'] = deadline - self.collect_share * optimize_kwargs['time_budget']
+        pending = set()
+        try:
+            for seed, restarts in zip(seeds, max_restarts):  # worker processes are started by the first submit
+                if restarts == 0 or (deadline is not None and time.monotonic() >= deadline):
+                    continue
+                pending.add(executor.submit(_swarm_worker, seed, restarts, optimize_kwargs, settings))
+            while pending:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break  # time budget spent, swarms without result are dropped
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                swarm_stats += [future.result() for future in done]
+                solutions = [(solution, stats) for solution, stats in swarm_stats if stats.converged]
+                if solutions and result_stats is None:
+                    result, result_stats = solutions[0]
+                    stop_event.set()  # cancels the remaining swarms at their next iteration
+        finally:
+            stop_event.set()
+            self.dropped = pending  # waited for at the start of the next call
+        anytime = [(solution, stats) for solution, stats in swarm_stats if stats.residual is not None]
+        if result_stats is None and optimize_kwargs.get('time_budget') is not None and anytime:
+            # no swarm converged within the time budget, best configuration of all swarms
+            result, result_stats = min(anytime, key=lambda swarm: swarm[1].residual)
+        # cancelled swarms are collected too (except the ones dropped at the deadline), so evaluation count covers
+        # all work done
+        self.stats.iterations = sum(stats.iterations for _, stats in swarm_stats)
+        self.stats.restarts = sum(stats.restarts for _, stats in swarm_stats)
+        self.stats.evaluations = sum(stats.evaluations for _, stats in swarm_stats)
+        if result_stats is None:
+            self.stats.finish(converged=False)
+        else:
+            self.stats.cost_history = result_stats.cost_history
+            self.stats.finish(converged=result_stats.converged, residual=result_stats.residual)
+        return result
+
+    def process_pool(self, workers: int):
+        """
+        Process pool of parallel optimize with its stop event, created on first use and reused by the next calls
+        (process startup is paid once). Swarms dropped by the previous call are awaited before the event is cleared.
+
+        :param workers: Number of worker processes, the pool is recreated when it changes.
+
+        :return: ProcessPoolExecutor and multiprocessing.Event.
+        """
+        if self.pool is not None and self.pool_workers != workers:
+            self.close()
+        if self.pool is None:
+            self.stop_event = multiprocessing.Event()
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(self.stop_event,))
+            self.pool_workers = workers
+        wait(self.dropped)  # stop_event is set, they finish at their next iteration
+        self.dropped = set()
+        self.stop_event.clear()
+        return self.pool, self.stop_event
+
+    def close(self):
+        """Shuts down the process pool of parallel optimize."""
+        if self.pool is not None:
+            self.stop_event.set()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+            self.dropped = set()
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class UnreachableTarget(np.ndarray):
+    """
+    Result of inverse kinematics for a target rejected by reachability_check. Behaves like the np.array([0.0]) value
+    returned by the solvers when no solution was found, so result.size == 1 checks still apply, but can be told apart
+    with isinstance.
+
+    reason: Description of the failed test.
+    """
+    def __new__(cls, reason: str = ''):
+        obj = np.zeros(1).view(cls)
+        obj.reason = reason
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.reason = getattr(obj, 'reason', '')
+
+
+def reachability_check(num_seg: int,
+                       seg_len: np.ndarray[float],
+                       angle_limits: np.ndarray[int],
+                       target_pos: np.ndarray[float],
+                       tolerance: float = 0.0001):
+    """
+    Function rejects targets which are certainly outside of the workspace, using envelopes computed from segment
+    lengths and theta limit. Tests are conservative, a reachable target is never rejected.
+
+    Bending of the backbone up to arc length s is at most theta_max * s, so the angle between the backbone tangent and
+    z-axis is bounded, which gives the lowest reachable z and the largest reachable distance from z-axis.
+
+    :param num_seg: Number of segments
+    :param seg_len: Lengths of the segments [m]
+    :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+    :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+    :param tolerance: Allowed distance of the target from the workspace [m]
+
+    :return: UnreachableTarget if the target is outside of the workspace, None otherwise.
+    """
+    length = float(np.sum(np.asarray(seg_len, dtype=float)[:num_seg]))  # total backbone length
+    theta_max = float(np.max(angle_limits[0]))
+    target_pos = np.asarray(target_pos, dtype=float)
+    radial = np.linalg.norm(target_pos[:2])
+
+    # Bounding sphere, backbone can't reach further than its length
+    if np.linalg.norm(target_pos) > length + tolerance:
+        return UnreachableTarget('Target is further from the base than the total length of the robot.')
+
+    # Lowest z: integral of cos(min(theta_max * s, pi)) over the backbone
+    bend_length = length if theta_max * length <= np.pi else np.pi / theta_max  # part where bending is not saturated
+    z_min = bend_length * np.sinc(theta_max * bend_length / np.pi) - (length - bend_length)
+    if target_pos[2] < z_min - tolerance:
+        return UnreachableTarget('Target is below the lowest point reachable with the theta limit.')
+
+    # Largest distance from z-axis: integral of sin(min(theta_max * s, pi / 2)) over the backbone
+    bend_length = length if theta_max * length <= np.pi / 2 else np.pi / 2 / theta_max
+    r_max = theta_max * bend_length ** 2 / 2 * np.sinc(theta_max * bend_length / 2 / np.pi) ** 2 + \
+        (length - bend_length)
+    if radial > r_max + tolerance:
+        return UnreachableTarget('Target is further from z-axis than reachable with the theta limit.')
+    return None
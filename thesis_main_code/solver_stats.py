@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import logging
+import itertools
+import contextlib
+import contextvars
+
+REPORT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "report.log")
+logger = logging.getLogger("ik_solver")  # Structured solver records, one JSON object per line
+_ids = itertools.count()  # Numbers of SolverStats created in this process
+_parent = contextvars.ContextVar('parent', default=None)  # id of the solve running nested solves
+
+
+def enable_report_log(path: str = REPORT_LOG):
+    """
+    Function writes solver records into the log file (report.log next to this module by default).
+
+    :param path: Log file path.
+    """
+    path = os.path.abspath(path)
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == path:
+            return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+@contextlib.contextmanager
+def nested(parent_id: str):
+    """
+    Function marks solves started inside the with block as part of the parent solve (e.g. local refinement inside a
+    global solver), their records carry the parent's id.
+
+    :param parent_id: SolverStats.id of the parent solve.
+    """
+    token = _parent.set(parent_id)
+    try:
+        yield
+    finally:
+        _parent.reset(token)
+
+
+class SolverStats:
+    """
+    Convergence telemetry of one inverse kinematics solve.
+
+    solver: Solver name.
+    cost_history: Global best cost (error [m]) after every iteration.
+    iterations: Total number of iterations (all restarts).
+    restarts: Number of restarts.
+    evaluations: Number of objective function (forward kinematics) evaluations.
+    phase_time: Wall time spent in phases of the solver [s].
+    wall_time: Wall time of the whole solve [s].
+    converged: True if the solver reached min_error.
+    residual: End-point error of the returned configuration [m], None if no configuration was returned.
+    id: Identifier of the solve, unique within the process.
+    parent: id of the solve this one is nested in (see nested), None for top-level solves.
+    """
+    def __init__(self, solver: str):
+        self.solver = solver
+        self.cost_history = []
+        self.iterations = 0
+        self.restarts = 0
+        self.evaluations = 0
+        self.phase_time = {}
+        self.wall_time = 0.0
+        self.converged = False
+        self.residual = None
+        self.id = f'{os.getpid()}-{next(_ids)}'
+        self.parent = _parent.get()
+        self.start = time.perf_counter()
+
+    def add_time(self, phase: str, start: float):
+        """Adds time elapsed from start (time.perf_counter() value) to the phase."""
+        self.phase_time[phase] = self.phase_time.get(phase, 0.0) + time.perf_counter() - start
+
+    def finish(self, converged: bool, residual: float = None):
+        """Records total wall time and result, writes the record to the solver log (if enabled)."""
+        self.wall_time = time.perf_counter() - self.start
+        self.converged = bool(converged)
+        self.residual = None if residual is None else float(residual)
+        if logger.isEnabledFor(logging.INFO):  # solves are on hot paths, no serialization without log
+            logger.info(json.dumps(self.as_dict()))
+
+    def as_dict(self) -> dict:
+        """Record of the solve, final cost instead of the whole cost history."""
+        return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'solver': self.solver,
+                'id': self.id,
+                'parent': self.parent,
+                'converged': self.converged,
+                'final_cost': self.cost_history[-1] if self.cost_history else None,
+                'residual': self.residual,
+                'iterations': self.iterations,
+                'restarts': self.restarts,
+                'evaluations': self.evaluations,
+                'wall_time': self.wall_time,
+                'phase_time': self.phase_time}
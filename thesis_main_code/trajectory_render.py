@@ -0,0 +1,130 @@
+"""
+Headless rendering of recorded trajectories into PNG frames and optionally a video file.
+
+Usage: python trajectory_render.py trajectory.npy --end-index 10 20 30 [--output frames] [--video motion.mp4]
+                                   [--fps 30] [--workers 4]
+
+trajectory.npy holds a (frames, n, 16) array of backbone curves in piecewise_cc format. Frames are rendered with the
+Agg canvas (no display or Tk needed) in parallel chunks across processes; the video is encoded by ffmpeg.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import numpy as np
+import matplotlib.image
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from cr_plot import PlotSetup
+
+FRAME_NAME = "frame_{:06d}.png"
+
+
+def _render_chunk(trajectory, start: int, stop: int, first: int, end_index: np.ndarray[int], extent: tuple,
+                  output_dir: str, dpi: int) -> int:
+    """
+    Renders frames start..stop of the trajectory, used by render_trajectory worker processes.
+
+    :param trajectory: (frames, n, 16) array (chunk of the trajectory) or .npy path (memory-mapped in the worker).
+    :param start: First frame of the chunk in trajectory.
+    :param stop: Frame after the last one of the chunk in trajectory.
+    :param first: Frame number of the first rendered frame in the file names.
+    :param end_index: Indices of where tdcr segments ends.
+    :param extent: Axes limits (xmax, ymax, zmax) shared by all frames.
+    :param output_dir: Directory of the PNG frames.
+    :param dpi: Resolution of the frames.
+
+    :return: Number of rendered frames.
+    """
+    if isinstance(trajectory, str):
+        trajectory = np.load(trajectory, mmap_mode='r')
+    plot = PlotSetup(g=np.asarray(trajectory[start]), new_g=np.asarray(trajectory[start]), end_index=end_index)
+    plot.fig.set_dpi(dpi)
+    canvas = FigureCanvasAgg(plot.fig)
+    for frame in range(start, stop):
+        plot.show(np.asarray(trajectory[frame]))
+        if frame == start:
+            plot.axes_setup(extent)
+        plot.blit(canvas)  # axes, legend and panes are rendered once per chunk
+        matplotlib.image.imsave(os.path.join(output_dir, FRAME_NAME.format(first + frame - start)),
+                                np.asarray(canvas.buffer_rgba()))
+    return stop - start
+
+
+def encode_video(output_dir: str, video_path: str, fps: int = 30):
+    """
+    Encodes the PNG frames of output_dir into a video file with ffmpeg (H.264 for .mp4).
+
+    :param output_dir: Directory with frames named by FRAME_NAME.
+    :param video_path: Output file, format given by the extension.
+    :param fps: Frame rate.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg was not found, video can't be encoded (PNG frames are kept).")
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+                    '-i', os.path.join(output_dir, FRAME_NAME.replace('{:06d}', '%06d')),
+                    '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', video_path], check=True)
+
+
+def render_trajectory(trajectory,
+                      end_index: np.ndarray[int],
+                      output_dir: str = "frames",
+                      video_path: str = None,
+                      fps: int = 30,
+                      dpi: int = 100,
+                      workers: int = None,
+                      chunk_size: int = None) -> int:
+    """
+    Function renders a recorded trajectory to PNG frames (and a video), without display, in parallel chunks.
+
+    :param trajectory: (frames, n, 16) array of backbone curves in piecewise_cc format, or .npy file path (workers
+        memory-map it instead of receiving copies).
+    :param end_index: Indices of where tdcr segments ends.
+    :param output_dir: Directory of the PNG frames, created if needed.
+    :param video_path: If given, frames are encoded into this video file with ffmpeg.
+    :param fps: Frame rate of the video.
+    :param dpi: Resolution of the frames (figure is 5x5 inches).
+    :param workers: Number of worker processes, os.cpu_count() by default, 1 renders in the calling process.
+    :param chunk_size: Number of frames rendered by one task, frames / (4 * workers) by default.
+
+    :return: Number of rendered frames.
+    """
+    frames = np.load(trajectory, mmap_mode='r') if isinstance(trajectory, str) else np.asarray(trajectory)
+    if frames.ndim != 3 or frames.shape[2] != 16:
+        raise ValueError("Trajectory has to be a (frames, n, 16) array.")
+    end_index = np.asarray(end_index, dtype=int)
+    os.makedirs(output_dir, exist_ok=True)
+    extent = PlotSetup.axes_extent(frames[:, :, 12:15])  # the same axes limits in all frames
+    workers = os.cpu_count() if workers is None else workers
+    chunk_size = max(int(np.ceil(len(frames) / (4 * workers))), 1) if chunk_size is None else chunk_size
+    chunks = [(start, min(start + chunk_size, len(frames))) for start in range(0, len(frames), chunk_size)]
+    if isinstance(trajectory, str):  # workers memory-map the file
+        args = [(trajectory, start, stop, start, end_index, extent, output_dir, dpi) for start, stop in chunks]
+    else:
+        args = [(frames[start:stop], 0, stop - start, start, end_index, extent, output_dir, dpi)
+                for start, stop in chunks]
+    if workers == 1:
+        rendered = [_render_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(_render_chunk, *zip(*args)))
+    if video_path is not None:
+        encode_video(output_dir, video_path, fps)
+    return int(np.sum(rendered))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a recorded continuum robot trajectory without display.')
+    parser.add_argument('trajectory', help='.npy file with (frames, n, 16) backbone curves.')
+    parser.add_argument('--end-index', type=int, nargs='+', required=True, help='Indices of where segments end.')
+    parser.add_argument('--output', default='frames', help='Directory of the PNG frames.')
+    parser.add_argument('--video', default=None, help='Video file encoded from the frames with ffmpeg.')
+    parser.add_argument('--fps', type=int, default=30, help='Frame rate of the video.')
+    parser.add_argument('--dpi', type=int, default=100, help='Resolution of the frames.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    count = render_trajectory(args.trajectory, args.end_index, output_dir=args.output, video_path=args.video,
+                              fps=args.fps, dpi=args.dpi, workers=args.workers)
+    print(f"{count} frames rendered into {args.output}")
@@ -0,0 +1,142 @@
+import os
+import numpy as np
+from forward_kinematics import piecewise_cc_batch
+
+
+class WorkspaceIndex:
+    """
+    Precomputed workspace of the robot: sampled configuration space angles (theta, phi) with their end-point positions,
+    stored in a uniform grid for nearest neighbour lookup. Used to seed or short-circuit inverse kinematics.
+
+    positions: (N, 3) end-point positions [m].
+    configurations: (N, 2*num_seg) configuration space angles (theta, phi) in degrees, same format as PSO result.
+    robot: dict with num_seg, seg_len, num_of_el, di and angle_limits the index was built for.
+    """
+    def __init__(self, positions: np.ndarray[float], configurations: np.ndarray[float], robot: dict):
+        self.positions = positions
+        self.configurations = configurations
+        self.robot = robot
+        # Grid setup, cell size chosen for ~4 points per occupied cell
+        self.origin = positions.min(axis=0)
+        extent = np.maximum(positions.max(axis=0) - self.origin, 1e-9)
+        self.cell_size = max(float(np.cbrt(np.prod(extent) / len(positions) * 4)), 1e-6)
+        self.shape = (extent // self.cell_size).astype(int) + 1
+        cell_keys = self.cell_key(self.cell_index(positions))
+        self.order = np.argsort(cell_keys, kind='stable')
+        self.keys, self.start, self.count = np.unique(cell_keys[self.order], return_index=True, return_counts=True)
+
+    @classmethod
+    def build(cls,
+              num_seg: int,
+              seg_len: np.ndarray[float],
+              num_of_el: np.ndarray[int],
+              di: float,
+              angle_limits: np.ndarray[int],
+              num_samples: int = 200000,
+              seed=0):
+        """
+        Samples the configuration space within angle_limits uniformly and computes end points with batched FK.
+
+        :param num_seg: Number of segments
+        :param seg_len: Lengths of the segments [m]
+        :param num_of_el: Number of elements per segment
+        :param di: Arc end connection distance from origin of local coordinate system [m]
+        :param angle_limits: array with theta max and phi max (starting from zero) in degrees.
+        :param num_samples: Number of sampled configurations. With the default the nearest sample is within 0.1 mm
+            for most single-segment targets, for more segments it is typically 0.3-0.9 mm away and serves as a seed
+            of a local solver (see IKSession).
+        :param seed: Seed of the random number generator.
+
+        :return: WorkspaceIndex
+        """
+        rng = np.random.default_rng(seed)
+        theta = rng.uniform(0, np.max(angle_limits[0]), [num_samples, num_seg])
+        phi = rng.uniform(0, np.max(angle_limits[1]), [num_samples, num_seg])
+        positions = piecewise_cc_batch(num_seg=num_seg,
+                                       theta=theta,
+                                       phi=np.deg2rad(phi),
+                                       seg_len=np.asarray(seg_len, dtype=float),
+                                       di=di,
+                                       num_of_el=np.asarray(num_of_el),
+                                       optimizer=True)
+        robot = dict(num_seg=num_seg, seg_len=np.asarray(seg_len, dtype=float), num_of_el=np.asarray(num_of_el),
+                     di=float(di), angle_limits=np.asarray(angle_limits))
+        return cls(positions, np.concatenate((theta, phi), axis=1), robot)
+
+    def save(self, path: str):
+        """Stores the index into .npz file."""
+        np.savez(path, positions=self.positions, configurations=self.configurations, **self.robot)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads index stored by save."""
+        with np.load(path) as data:
+            robot = {key: data[key] for key in ('num_seg', 'seg_len', 'num_of_el', 'di', 'angle_limits')}
+            robot['num_seg'] = int(robot['num_seg'])
+            robot['di'] = float(robot['di'])
+            return cls(data['positions'], data['configurations'], robot)
+
+    @classmethod
+    def load_or_build(cls, path: str, **robot):
+        """
+        Loads index from path if it was built for the same robot, otherwise builds it and saves it to path.
+
+        :param path: .npz file path.
+        :param robot: Keyword arguments of build.
+        """
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.matches(**robot):
+                return index
+        index = cls.build(**robot)
+        index.save(path)
+        return index
+
+    def matches(self, num_seg, seg_len, num_of_el, di, angle_limits, **_) -> bool:
+        """Checks if index was built for the given robot geometry."""
+        return (self.robot['num_seg'] == num_seg and
+                np.array_equal(self.robot['seg_len'], np.asarray(seg_len, dtype=float)) and
+                np.array_equal(self.robot['num_of_el'], np.asarray(num_of_el)) and
+                self.robot['di'] == di and
+                np.array_equal(self.robot['angle_limits'], np.asarray(angle_limits)))
+
+    def cell_index(self, points: np.ndarray[float]) -> np.ndarray[int]:
+        """Integer (ix, iy, iz) grid coordinates of points, clipped to the grid."""
+        return np.clip(((points - self.origin) // self.cell_size).astype(int), 0, self.shape - 1)
+
+    def cell_key(self, cell: np.ndarray[int]) -> np.ndarray[int]:
+        """Linear key of (ix, iy, iz) grid coordinates."""
+        return (cell[..., 0] * self.shape[1] + cell[..., 1]) * self.shape[2] + cell[..., 2]
+
+    def query(self, target_pos: np.ndarray[float], max_ring: int = 3) -> tuple[np.ndarray[float], float]:
+        """
+        Nearest sampled configuration to the target point.
+
+        :param target_pos: Coordinates of the target point (Ex, Ey, Ez)
+        :param max_ring: Number of neighbouring cell rings searched before falling back to exhaustive search.
+
+        :return: configuration, distance: Configuration space angles and end-point distance from the target [m].
+        """
+        target_pos = np.asarray(target_pos, dtype=float)
+        center = self.cell_index(target_pos)
+        # ring search is exact only for targets inside the grid
+        inside = np.all((target_pos >= self.origin) & (target_pos < self.origin + self.shape * self.cell_size))
+        for ring in range(1, max_ring + 1) if inside else ():
+            offsets = np.arange(-ring, ring + 1)
+            cells = center + np.stack(np.meshgrid(offsets, offsets, offsets, indexing='ij'), axis=-1).reshape(-1, 3)
+            cells = cells[np.all((cells >= 0) & (cells < self.shape), axis=1)]
+            slots = np.searchsorted(self.keys, self.cell_key(cells))
+            slots = slots[slots < len(self.keys)]
+            slots = slots[np.isin(self.keys[slots], self.cell_key(cells))]
+            if slots.size == 0:
+                continue
+            candidates = self.order[np.concatenate([np.arange(self.start[k], self.start[k] + self.count[k])
+                                                    for k in slots])]
+            distances = np.linalg.norm(self.positions[candidates] - target_pos, axis=1)
+            best = np.argmin(distances)
+            # points outside of searched cells are at least ring * cell_size far away
+            if distances[best] <= ring * self.cell_size:
+                return self.configurations[candidates[best]], float(distances[best])
+        distances = np.linalg.norm(self.positions - target_pos, axis=1)
+        best = np.argmin(distances)
+        return self.configurations[best], float(distances[best])